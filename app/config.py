@@ -2,6 +2,7 @@
 import os
 
 from dotenv import load_dotenv
+from pydantic import computed_field, field_validator
 from pydantic_settings import BaseSettings
 
 load_dotenv()  # .envファイルを読み込む
@@ -14,12 +15,38 @@ class Settings(BaseSettings):
     aws_default_region: str = os.getenv("AWS_DEFAULT_REGION", "ap-northeast-1")
     dynamodb_table_name: str = os.getenv("DYNAMODB_TABLE_NAME", "QuizSessionTable")
     s3_bucket_name: str = os.getenv("S3_BUCKET_NAME", "quiz-app-bucket")
-    frontend_origin: str = os.getenv("FRONTEND_ORIGIN", "http://localhost:3000")
+    frontend_origin: str | None = os.getenv("FRONTEND_ORIGIN", "http://localhost:3000")
 
     # DynamoDB設定
     dynamodb_quiz_problems_table_name: str = "QuizProblems"
     dynamodb_session_table_name: str = "QuizSessionTable"
     gsi_book_source_index_name: str = "bookSource-questionId-index"
+    # questionId は bookSource ごとのプレフィックス + 3桁の連番 ("RC001" など) で振られている。
+    # 連番に従わない bookSource はここから外すと、連番IDからの直接取得を行わない
+    question_id_prefixes: dict[str, str] = {
+        "readable_code": "RC",
+        "programming_principles": "PP",
+    }
+
+    # DynamoDBクライアント (botocore) 設定
+    dynamodb_max_pool_connections: int = 64
+    dynamodb_max_retry_attempts: int = 5
+    dynamodb_connect_timeout: float = 1.0
+    dynamodb_read_timeout: float = 3.0
+
+    @field_validator("frontend_origin", mode="after")
+    @classmethod
+    def _normalize_frontend_origin(cls, value: str | None) -> str | None:
+        # 空文字や文字列の "None" は未設定として扱う
+        if not value or value == "None":
+            return None
+        return value
+
+    @computed_field
+    @property
+    def cors_origins(self) -> list[str]:
+        """CORSで許可するオリジン (未設定なら空リスト)"""
+        return [self.frontend_origin] if self.frontend_origin else []
 
 
 settings = Settings()
@@ -1,14 +1,26 @@
 import asyncio
 import logging
 import random
+import secrets
 import time
-import uuid
-from typing import Annotated, Any, Dict, List, Literal, Optional
+import zlib
+from typing import (
+    Annotated,
+    Any,
+    Awaitable,
+    Dict,
+    Iterable,
+    List,
+    Literal,
+    Optional,
+    Tuple,
+)
 
 import aioboto3
-from boto3.dynamodb.conditions import Key
-from boto3.dynamodb.types import TypeDeserializer
-from botocore.exceptions import ClientError
+import orjson
+from boto3.dynamodb.types import DYNAMODB_CONTEXT, TypeDeserializer
+from botocore.config import Config
+from botocore.exceptions import BotoCoreError, ClientError
 from fastapi import (
     Body,
     Depends,
@@ -18,8 +30,9 @@ from fastapi import (
     Request,
 )
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, Response
 from mangum import Mangum
+from pydantic import TypeAdapter
 
 from .config import settings
 from .models import (
@@ -39,6 +52,14 @@ logger = logging.getLogger(__name__)
 logger.setLevel(logging.INFO)
 
 _dynamodb_deserializer = TypeDeserializer()
+_deserialize_dynamodb_value = _dynamodb_deserializer.deserialize
+# TypeDeserializer と同じく、精度を超える数値は丸めずにエラーにする Context で変換する
+_create_dynamodb_decimal = DYNAMODB_CONTEXT.create_decimal
+_problem_list_adapter = TypeAdapter(List[ProblemData])
+# 問題の抽出・選択肢のシャッフルに使う乱数生成器 (モジュールのグローバル random を経由しない)
+_rng = random.Random()
+# セッションの TTL 計算に使う現在時刻 (テストでは time モジュール全体ではなくこれだけを差し替える)
+_now = time.time
 
 
 def deserialize_dynamodb_item_fully(item: Dict[str, Any]) -> Dict[str, Any]:
@@ -46,37 +67,50 @@ def deserialize_dynamodb_item_fully(item: Dict[str, Any]) -> Dict[str, Any]:
         return {}
     python_native_item = {}
     for key, value in item.items():
-        python_native_item[key] = _dynamodb_deserializer.deserialize(value)
+        # 大半を占める S / N の単一値は TypeDeserializer のディスパッチを通さずに変換する
+        if len(value) == 1:
+            (tag, raw_value), = value.items()
+            if tag == "S":
+                python_native_item[key] = raw_value
+                continue
+            if tag == "N":
+                python_native_item[key] = _create_dynamodb_decimal(raw_value)
+                continue
+        python_native_item[key] = _deserialize_dynamodb_value(value)
     return python_native_item
 
 
 # --- グローバルAWSクライアントの宣言 ---
+# Session の生成は通信を伴わないので、コールドスタート時のモジュール読み込みで1度だけ行う
+_aws_session = aioboto3.Session(region_name=settings.aws_default_region)
 _aws_dynamodb_client: Optional[Any] = None
-_aws_quiz_problems_table: Optional[Any] = None
-_aws_session_data_table: Optional[Any] = None
 _client_init_lock = asyncio.Lock()
 
 
 async def _initialize_global_aws_clients():
-    global _aws_dynamodb_client, _aws_quiz_problems_table, _aws_session_data_table
+    global _aws_dynamodb_client
     async with _client_init_lock:
         if _aws_dynamodb_client is None:
             logger.info("Initializing AWS clients globally...")
-            session = aioboto3.Session(region_name=settings.aws_default_region)
-            temp_dynamodb_client = session.client(
-                "dynamodb", region_name=settings.aws_default_region
-            )
-            _aws_dynamodb_client = await temp_dynamodb_client.__aenter__()
-            temp_dynamodb_resource = session.resource(
-                "dynamodb", region_name=settings.aws_default_region
+            # resource API は使わず、低レベルクライアント1つで全テーブルを操作する
+            # 接続プールを広げ、スロットリングは SDK の adaptive リトライに任せる
+            # ウォームな間の空き接続が切られて TLS ハンドシェイクをやり直さないよう keep-alive を有効にする
+            client_config = Config(
+                tcp_keepalive=True,
+                max_pool_connections=settings.dynamodb_max_pool_connections,
+                retries={
+                    "mode": "adaptive",
+                    "max_attempts": settings.dynamodb_max_retry_attempts,
+                },
+                connect_timeout=settings.dynamodb_connect_timeout,
+                read_timeout=settings.dynamodb_read_timeout,
             )
-            entered_dynamodb_resource = await temp_dynamodb_resource.__aenter__()
-            _aws_quiz_problems_table = await entered_dynamodb_resource.Table(
-                settings.dynamodb_quiz_problems_table_name
-            )
-            _aws_session_data_table = await entered_dynamodb_resource.Table(
-                settings.dynamodb_session_table_name
+            temp_dynamodb_client = _aws_session.client(
+                "dynamodb",
+                region_name=settings.aws_default_region,
+                config=client_config,
             )
+            _aws_dynamodb_client = await temp_dynamodb_client.__aenter__()
             logger.info("AWS clients initialized globally.")
         else:
             logger.info("AWS clients already initialized globally.")
@@ -93,41 +127,46 @@ async def get_dynamodb_client() -> Any:
     return _aws_dynamodb_client
 
 
-async def get_quiz_problems_table() -> Any:
-    if _aws_quiz_problems_table is None:
-        await _initialize_global_aws_clients()
-    if _aws_quiz_problems_table is None:
-        raise HTTPException(
-            status_code=503,
-            detail="Quiz problems table not available after initialization attempt.",
-        )
-    return _aws_quiz_problems_table
-
-
-async def get_session_data_table() -> Any:
-    if _aws_session_data_table is None:
-        await _initialize_global_aws_clients()
-    if _aws_session_data_table is None:
-        raise HTTPException(
-            status_code=503,
-            detail="Session data table not available after initialization attempt.",
-        )
-    return _aws_session_data_table
-
-
 app = FastAPI(title="Quiz App Backend")
 
-origin = settings.frontend_origin
-origins = [origin] if origin and origin != "None" and origin != "" else ["*"]
+# allow_credentials=True と "*" は CORS 仕様上併用できないため、未設定時はどのオリジンも許可しない
 app.add_middleware(
     CORSMiddleware,
-    allow_origins=origins,
+    allow_origins=settings.cors_origins,
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
 )
 
 SESSION_TTL_SECONDS = 2 * 60 * 60
+SESSION_DATA_COMPRESSION_LEVEL = 6
+BATCH_GET_ITEM_MAX_KEYS = 100
+DERIVED_ID_MAX_ROUNDS = 3  # 欠番で足りない分を取り直す最大回数
+# 問題アイテムのうち ProblemData とレスポンスで使う属性だけを取得する
+# (explanation は referencePages や additionalResources を除いた本文のみ)
+PROBLEM_PROJECTION_EXPRESSION = "#qid, #bs, #cat, #q, #opts, #ans, #expl.#expl"
+PROBLEM_PROJECTION_ATTRIBUTE_NAMES = {
+    "#qid": "questionId",
+    "#bs": "bookSource",
+    "#cat": "category",
+    "#q": "question",
+    "#opts": "options",
+    "#ans": "correctAnswer",
+    "#expl": "explanation",
+}
+
+# --- 問題プールのウォームキャッシュ ---
+# Lambda はウォームな間モジュールのグローバル変数を保持するため、bookSource ごとに
+# 多めに取得した問題プールを保持し、ヒット時はサンプリングだけで DynamoDB アクセスを省く。
+# 問題カタログはほぼ静的なので TTL は長めに取る。キーは bookSource の3通りしかないため件数制限は設けない。
+PROBLEM_POOL_CACHE_TTL_SECONDS = 600
+PROBLEM_POOL_SIZE = 200  # count の上限 (50) の4倍
+_problem_pool_cache: Dict[str, Tuple[float, List[ProblemData]]] = {}
+# 取得し直す間だけ bookSource ごとに保持するロック (ヒット時はロックを取らない)
+_problem_pool_cache_locks: Dict[str, asyncio.Lock] = {}
+# 直近に読んだ bookSource ごとの問題数。count より多いと分かっている場合だけ
+# 連番IDからの直接取得を試す (小さいカタログは全件読む方が安い)
+_problem_catalog_sizes: Dict[str, int] = {}
 
 
 class ServiceError(Exception):
@@ -152,33 +191,58 @@ async def service_exception_handler(request: Request, exc: ServiceError):
 # --- DynamoDB Operations Helpers ---
 
 
-async def _get_all_question_ids_for_source(
-    quiz_problems_table: Any, book_source_value: str
-) -> List[str]:
+class _ReservoirSampler:
     """
-    指定されたbookSourceのすべての問題IDをページネーションを使用して取得する。
+    Algorithm R によるリザーバサンプリング。
+    全件をメモリに載せずに、ストリームから一様ランダムに最大 size 件を選ぶ。
+    """
+
+    def __init__(self, size: int):
+        self.size = size
+        self.items: List[str] = []
+        self.seen = 0
+
+    def add(self, item: str) -> None:
+        if len(self.items) < self.size:
+            self.items.append(item)
+        else:
+            replace_index = _rng.randrange(self.seen + 1)
+            if replace_index < self.size:
+                self.items[replace_index] = item
+        self.seen += 1
+
+
+async def _sample_problems_for_source(
+    dynamodb_client: Any, book_source_value: str, reservoir: _ReservoirSampler
+) -> None:
+    """
+    指定されたbookSourceの問題IDをGSIからページネーションしながら読み、リザーバに投入する。
+    GSI の射影設定に依存しないよう、キー属性の questionId だけを取得する。
+    リザーバは全ページを読む必要があるため Limit は付けず、1MB 単位のページで読む。
     """
-    question_ids: List[str] = []
     last_evaluated_key: Optional[Dict[str, Any]] = None
     query_count = 0  # 念のため無限ループを防ぐカウンター（本番では調整または削除）
+    source_seen = 0
 
     logger.info(
-        f"Fetching all question IDs for bookSource: {book_source_value} using GSI: {settings.gsi_book_source_index_name}"
+        f"Sampling question IDs for bookSource: {book_source_value} using GSI: {settings.gsi_book_source_index_name} (sample size {reservoir.size})"
     )
     while (
         query_count < 10
     ):  # 最大10ページまで（DynamoDBの1MB制限とアイテムサイズによる）
         # この制限は実際のデータ量に応じて調整が必要
         query_kwargs = {
+            "TableName": settings.dynamodb_quiz_problems_table_name,
             "IndexName": settings.gsi_book_source_index_name,
-            "KeyConditionExpression": Key("bookSource").eq(book_source_value),
+            "KeyConditionExpression": "bookSource = :bs",
+            "ExpressionAttributeValues": {":bs": {"S": book_source_value}},
             "ProjectionExpression": "questionId",  # 取得する属性をquestionIdのみに限定
         }
         if last_evaluated_key:
             query_kwargs["ExclusiveStartKey"] = last_evaluated_key
 
         try:
-            response = await quiz_problems_table.query(**query_kwargs)
+            response = await dynamodb_client.query(**query_kwargs)
             query_count += 1
         except ClientError as e:
             logger.error(
@@ -191,158 +255,241 @@ async def _get_all_question_ids_for_source(
                 detail=f"Database query failed for source '{book_source_value}'.",
             )
 
-        items = response.get("Items", [])
-        for item in items:
+        for item in response.get("Items", []):
             if "questionId" in item:
-                question_ids.append(item["questionId"])
+                reservoir.add(item["questionId"]["S"])
+                source_seen += 1
 
         last_evaluated_key = response.get("LastEvaluatedKey")
         if not last_evaluated_key:
             logger.info(
-                f"Finished fetching all question IDs for {book_source_value}. Total IDs: {len(question_ids)} after {query_count} queries."
+                f"Finished sampling problems for {book_source_value}. Items seen so far: {reservoir.seen} after {query_count} queries."
             )
             break
         else:
             logger.info(
-                f"Paginating for {book_source_value}. So far {len(question_ids)} IDs after {query_count} queries. Next key: {last_evaluated_key}"
+                f"Paginating for {book_source_value}. Items seen so far: {reservoir.seen} after {query_count} queries. Next key: {last_evaluated_key}"
             )
 
     if last_evaluated_key:  # ループが最大試行回数で終了した場合
         logger.warning(
-            f"Stopped fetching question IDs for {book_source_value} due to query limit ({query_count} queries). "
-            f"Some questions might be missing if there were more pages. LastEvaluatedKey was: {last_evaluated_key}"
+            f"Stopped sampling problems for {book_source_value} due to query limit ({query_count} queries). "
+            f"Questions on later pages were not considered. LastEvaluatedKey was: {last_evaluated_key}"
         )
+    # 打ち切った場合も少なくともこの件数はあるので、次回の取得方法の判断に使う
+    _problem_catalog_sizes[book_source_value] = source_seen
 
-    return question_ids
 
+async def _run_all_or_cancel(coros: Iterable[Awaitable[Any]]) -> List[Any]:
+    """
+    コルーチンを並行に実行し、結果を渡された順に返す。
+    1つでも失敗したら、残りの完了を待たずにキャンセルして例外をそのまま投げる。
+    """
+    tasks = [asyncio.create_task(coro) for coro in coros]
+    try:
+        # 完了した順に結果を確認し、失敗があればその時点で打ち切る
+        for finished in asyncio.as_completed(tasks):
+            await finished
+    finally:
+        for task in tasks:
+            if not task.done():
+                task.cancel()
+    return [task.result() for task in tasks]
+
+
+async def _max_question_number_for_source(
+    dynamodb_client: Any, book_source_value: str, prefix: str
+) -> Optional[int]:
+    """
+    GSI のソートキー (questionId) の降順で1件だけ読み、最大の連番を返す。
+    問題がなければ 0、ID が prefix + 連番の形式でなければ None を返す。
+    連番は3桁ゼロ埋めの前提 (桁数が混在すると文字列順と数値順が一致しない)。
+    """
+    response = await dynamodb_client.query(
+        TableName=settings.dynamodb_quiz_problems_table_name,
+        IndexName=settings.gsi_book_source_index_name,
+        KeyConditionExpression="bookSource = :bs",
+        ExpressionAttributeValues={":bs": {"S": book_source_value}},
+        ProjectionExpression="questionId",
+        ScanIndexForward=False,
+        Limit=1,
+    )
+    items = response.get("Items", [])
+    if not items:
+        return 0
+    max_question_id = items[0]["questionId"]["S"]
+    number_part = max_question_id[len(prefix) :]
+    if not max_question_id.startswith(prefix) or not number_part.isdigit():
+        logger.warning(
+            f"Question ID {max_question_id} for {book_source_value} does not follow the '{prefix}' + number format."
+        )
+        return None
+    return int(number_part)
+
+
+async def _batch_get_problem_items(
+    dynamodb_client: Any, question_ids: List[str]
+) -> List[Dict[str, Any]]:
+    """BatchGetItem で問題アイテムを取得する。存在しないIDは結果に含まれない。"""
+    keys_for_batch_get = [{"questionId": {"S": q_id}} for q_id in question_ids]
+    # BatchGetItemは1リクエスト最大100キーのため、超える分は分割して並行に取得する
+    batch_responses = await asyncio.gather(
+        *(
+            dynamodb_client.batch_get_item(
+                RequestItems={
+                    settings.dynamodb_quiz_problems_table_name: {
+                        "Keys": keys_for_batch_get[
+                            start : start + BATCH_GET_ITEM_MAX_KEYS
+                        ],
+                        "ProjectionExpression": PROBLEM_PROJECTION_EXPRESSION,
+                        "ExpressionAttributeNames": PROBLEM_PROJECTION_ATTRIBUTE_NAMES,
+                    }
+                }
+            )
+            for start in range(0, len(keys_for_batch_get), BATCH_GET_ITEM_MAX_KEYS)
+        )
+    )
 
-async def get_questions_from_dynamodb(
-    dynamodb_client: Annotated[Any, Depends(get_dynamodb_client)],
-    quiz_problems_table: Annotated[Any, Depends(get_quiz_problems_table)],
-    book_source: Literal["readable_code", "programming_principles", "both"],
-    count: int,
-) -> List[ProblemData]:
-    target_book_sources: List[str] = []
-    if book_source == "both":
-        target_book_sources.extend(["readable_code", "programming_principles"])
-    else:
-        target_book_sources.append(book_source)
+    raw_items: List[Dict[str, Any]] = []
+    unprocessed_count = 0
+    for response in batch_responses:
+        raw_items.extend(
+            response.get("Responses", {}).get(
+                settings.dynamodb_quiz_problems_table_name, []
+            )
+        )
+        unprocessed_keys = response.get("UnprocessedKeys", {}).get(
+            settings.dynamodb_quiz_problems_table_name
+        )
+        if unprocessed_keys:
+            unprocessed_count += len(unprocessed_keys["Keys"])
 
-    all_question_ids_from_gsi: List[str] = []
+    if unprocessed_count:
+        # UnprocessedKeys は正常応答の一部として返るため SDK は再試行しない。
+        # 取得できなかった分は欠番と同じく呼び出し側で別のIDから補う。
+        logger.warning(
+            f"BatchGetItem returned {unprocessed_count} UnprocessedKeys; they will be replaced by other IDs."
+        )
+    return raw_items
+
+
+async def _sample_problem_items_by_derived_ids(
+    dynamodb_client: Any, target_book_sources: List[str], count: int
+) -> Optional[List[Dict[str, Any]]]:
+    """
+    最大の連番だけを読み、1からその番号までの questionId をローカルで抽出して
+    BatchGetItem で直接取得する。GSI から全問題IDを転送せずに済む。
+    欠番は取得できなかった分を残りの候補で補うので、存在するIDから一様に選ばれる。
+    カタログ全体を読むのと変わらない場合や、欠番が多くcount件そろわない場合は
+    None を返し、リザーバサンプリングに任せる。
+    """
+    prefixes = settings.question_id_prefixes
+    if any(src not in prefixes for src in target_book_sources):
+        return None  # 連番で振られていない bookSource が含まれる
 
     try:
-        tasks_for_ids_collection = []
-        for src in target_book_sources:
-            # 各ソースの全問題ID取得をタスクとして追加
-            tasks_for_ids_collection.append(
-                _get_all_question_ids_for_source(quiz_problems_table, src)
+        max_numbers = await _run_all_or_cancel(
+            _max_question_number_for_source(dynamodb_client, src, prefixes[src])
+            for src in target_book_sources
+        )
+    except (ClientError, BotoCoreError) as e:
+        logger.warning(
+            f"Max question ID query failed, falling back to reservoir sampling: {e}"
+        )
+        return None
+    if None in max_numbers:
+        return None
+
+    # 問題数ではなく最大の連番まで候補にする (欠番があっても末尾のIDを取りこぼさない)
+    candidate_ids = [
+        f"{prefixes[src]}{number:03d}"
+        for src, max_number in zip(target_book_sources, max_numbers)
+        for number in range(1, max_number + 1)
+    ]
+    if len(candidate_ids) <= count:
+        return None
+
+    # 候補をシャッフルしておき、先頭から順に使う。欠番があれば続きの候補で補う
+    _rng.shuffle(candidate_ids)
+    raw_items: List[Dict[str, Any]] = []
+    next_candidate = 0
+    for _ in range(DERIVED_ID_MAX_ROUNDS):
+        ids_to_fetch = candidate_ids[
+            next_candidate : next_candidate + count - len(raw_items)
+        ]
+        if not ids_to_fetch:
+            break
+        next_candidate += len(ids_to_fetch)
+        try:
+            fetched_items = await _batch_get_problem_items(
+                dynamodb_client, ids_to_fetch
+            )
+        except (ClientError, BotoCoreError) as e:
+            logger.warning(
+                f"BatchGetItem failed, falling back to reservoir sampling: {e}"
             )
+            return None
+        if not fetched_items:
+            # 1件も存在しないなら ID が連番に従っていないので、残りの候補も試さない
+            break
+        raw_items.extend(fetched_items)
+        if len(raw_items) >= count:
+            logger.info(
+                f"Selected {len(raw_items)} random questions by derived IDs from {len(candidate_ids)} candidates."
+            )
+            return raw_items
 
-        # asyncio.gather を使って各ソースのIDリストを並行して取得
-        results_per_source = await asyncio.gather(
-            *tasks_for_ids_collection, return_exceptions=True
-        )
+    logger.info(
+        f"Only {len(raw_items)} of {count} derived question IDs exist; falling back to reservoir sampling."
+    )
+    return None
 
-        for idx, source_result in enumerate(results_per_source):
-            current_source = target_book_sources[idx]
-            if isinstance(source_result, Exception):
-                # _get_all_question_ids_for_source内でServiceErrorが投げられるか、ClientErrorがここで捕捉される
-                if isinstance(source_result, ServiceError):
-                    raise source_result  # そのまま投げる
-                logger.error(
-                    f"Failed to fetch all question IDs for '{current_source}': {source_result}",
-                    exc_info=True,
-                )
-                # ここで ServiceError を発生させる
-                raise ServiceError(
-                    status_code=500,
-                    detail=f"Could not retrieve complete question ID list for '{current_source}'.",
-                )
-            # source_result は question_ids のリスト
-            all_question_ids_from_gsi.extend(source_result)
-            # logger.info(f"Successfully fetched {len(source_result)} question IDs for bookSource: {current_source}") # _get_all_question_ids_for_source内でログ出力済
 
-    except ClientError as e:  # _get_all_question_ids_for_source で捕捉されなかった場合や、gather起因のClientError
+async def _sample_problem_items_by_reservoir(
+    dynamodb_client: Any, target_book_sources: List[str], count: int
+) -> List[Dict[str, Any]]:
+    """
+    GSIの問題IDをページネーションしながら読み、リザーバサンプリングで最大count件を選んで
+    BatchGetItemで取得する。
+    """
+    # "both" の場合も1つのリザーバを共有し、両ソースを通して一様にサンプリングする
+    reservoir = _ReservoirSampler(count)
+
+    try:
+        # リザーバはページが届くたびに更新されるので、遅い方のソースを待つ間も先に返ったページを処理できる
+        await _run_all_or_cancel(
+            _sample_problems_for_source(dynamodb_client, src, reservoir)
+            for src in target_book_sources
+        )
+    except ClientError as e:  # _sample_problems_for_source で捕捉されなかった場合のClientError
         logger.error(
-            f"DynamoDB ClientError while gathering all question IDs: {e}", exc_info=True
+            f"DynamoDB ClientError while sampling questions: {e}", exc_info=True
         )
         raise ServiceError(
             status_code=500,
-            detail="Error communicating with database for complete question IDs.",
+            detail="Error communicating with database for questions.",
         )
-    except ServiceError:  # 上記の raise source_result や raise ServiceError を再throw
+    except ServiceError:  # _sample_problems_for_source内で投げられたものはそのまま投げる
         raise
     except Exception as e:  # その他の予期せぬエラー
-        logger.error(
-            f"Unexpected error while fetching all question IDs: {e}", exc_info=True
-        )
+        logger.error(f"Unexpected error while sampling questions: {e}", exc_info=True)
         raise ServiceError(
-            status_code=500, detail="Unexpected error fetching complete question IDs."
+            status_code=500, detail="Unexpected error fetching questions."
         )
 
-    # GSIクエリ後のログからページネーション未対応の警告は削除
-    # logger.warning(f"Warning: More items available for bookSource {current_source}...") は不要
-
-    if not all_question_ids_from_gsi:
+    if reservoir.seen == 0:
         raise ServiceError(
             status_code=404,
             detail=f"No questions found for source(s): {', '.join(target_book_sources)}",
         )
 
-    # 重複するIDがある場合、一意にする（"both" の場合に理論上ありえるが、現状のデータ構造では問題IDはユニークのはず）
-    # ただし、異なるソースで同じ問題IDが使われる可能性が将来的にあるなら考慮
-    unique_question_ids = list(set(all_question_ids_from_gsi))
-    if len(unique_question_ids) != len(all_question_ids_from_gsi):
+    if len(reservoir.items) < count:
         logger.info(
-            f"Duplicate question IDs found and removed. Original count: {len(all_question_ids_from_gsi)}, Unique count: {len(unique_question_ids)}"
+            f"Requested {count} questions, but only {reservoir.seen} questions available for source(s) '{', '.join(target_book_sources)}'."
         )
 
-    all_question_ids_from_gsi = unique_question_ids
-
-    num_to_fetch = min(count, len(all_question_ids_from_gsi))
-    if num_to_fetch < count:
-        logger.warning(
-            f"Requested {count} questions, but only {len(all_question_ids_from_gsi)} unique questions available for source(s) '{', '.join(target_book_sources)}'. Fetching {num_to_fetch}."
-        )
-
-    if num_to_fetch == 0:
-        return []
-
-    selected_ids = random.sample(all_question_ids_from_gsi, num_to_fetch)
-    logger.info(
-        f"Selected {len(selected_ids)} random question IDs for BatchGetItem from a pool of {len(all_question_ids_from_gsi)} unique IDs."
-    )
-
-    problems: List[ProblemData] = []
-    if not selected_ids:
-        return problems
-
     try:
-        keys_for_batch_get = [{"questionId": {"S": q_id}} for q_id in selected_ids]
-        # BatchGetItemは最大100アイテムまで。selected_idsが100を超える場合は分割が必要。
-        # 現状のcountのmaxは50なので、selected_idsが100を超えることはない。
-        request_items = {
-            settings.dynamodb_quiz_problems_table_name: {
-                "Keys": keys_for_batch_get,
-                # "ConsistentRead": True # 必要に応じて整合性を高めるが、コストとレイテンシに影響
-            }
-        }
-        response = await dynamodb_client.batch_get_item(RequestItems=request_items)
-
-        raw_problems_from_db = response.get("Responses", {}).get(
-            settings.dynamodb_quiz_problems_table_name, []
-        )
-        logger.info(f"Retrieved {len(raw_problems_from_db)} items from BatchGetItem.")
-
-        if response.get("UnprocessedKeys", {}).get(
-            settings.dynamodb_quiz_problems_table_name
-        ):
-            # UnprocessedKeysの処理は複雑なので、ここでは警告に留める。
-            # 本番環境ではリトライロジックを検討。
-            logger.warning(
-                "Warning: BatchGetItem returned UnprocessedKeys, some items may not have been retrieved. "
-                f"Unprocessed count: {len(response['UnprocessedKeys'][settings.dynamodb_quiz_problems_table_name]['Keys'])}"
-            )
+        raw_items = await _batch_get_problem_items(dynamodb_client, reservoir.items)
     except ClientError as e:
         logger.error(f"DynamoDB ClientError during BatchGetItem: {e}", exc_info=True)
         raise ServiceError(
@@ -353,25 +500,66 @@ async def get_questions_from_dynamodb(
         raise ServiceError(
             status_code=500, detail="Unexpected error fetching problem details."
         )
+    logger.info(
+        f"Selected {len(reservoir.items)} random question IDs from a stream of {reservoir.seen} IDs; retrieved {len(raw_items)} items."
+    )
+    return raw_items
 
-    parsed_count = 0
-    for item_dict in raw_problems_from_db:
-        try:
-            python_native_dict = deserialize_dynamodb_item_fully(item_dict)
-            problems.append(ProblemData.model_validate(python_native_dict))
-            parsed_count += 1
-        except Exception as e:
-            logger.error(
-                f"Error validating problem data from DynamoDB: {e}, item_id: {item_dict.get('questionId', {}).get('S')}",
-                exc_info=True,
-            )
-            continue
 
-    if (
-        not problems and num_to_fetch > 0
-    ):  # 取得IDはあったが、BatchGetItemやパースで全滅した場合
+async def _fetch_problems_from_dynamodb(
+    dynamodb_client: Any,
+    book_source: Literal["readable_code", "programming_principles", "both"],
+    count: int,
+) -> List[ProblemData]:
+    """
+    最大count件の問題をランダムに選んで取得する。
+    問題数が count より多いと分かっていれば連番IDからの直接取得を試し、
+    使えない場合はGSI全体のリザーバサンプリングに切り替える。
+    """
+    target_book_sources: List[str] = []
+    if book_source == "both":
+        target_book_sources.extend(["readable_code", "programming_principles"])
+    else:
+        target_book_sources.append(book_source)
+
+    raw_problems_from_db: Optional[List[Dict[str, Any]]] = None
+    known_total = sum(_problem_catalog_sizes.get(src, 0) for src in target_book_sources)
+    if known_total > count:
+        # count 以下と分かっているか未計測なら、最初からリザーバで読む
+        raw_problems_from_db = await _sample_problem_items_by_derived_ids(
+            dynamodb_client, target_book_sources, count
+        )
+    if raw_problems_from_db is None:
+        raw_problems_from_db = await _sample_problem_items_by_reservoir(
+            dynamodb_client, target_book_sources, count
+        )
+
+    problems: List[ProblemData] = []
+    try:
+        # 通常は全件が正しいので、リスト全体を pydantic-core で一括検証する
+        problems = _problem_list_adapter.validate_python(
+            [deserialize_dynamodb_item_fully(item) for item in raw_problems_from_db]
+        )
+    except Exception as e:
+        logger.warning(
+            f"Batch validation of problem data failed, falling back to per-item validation: {e}"
+        )
+        # 不正なアイテムだけを読み飛ばすため、1件ずつ検証し直す
+        for item_dict in raw_problems_from_db:
+            try:
+                python_native_dict = deserialize_dynamodb_item_fully(item_dict)
+                problems.append(ProblemData.model_validate(python_native_dict))
+            except Exception as item_error:
+                logger.error(
+                    f"Error validating problem data from DynamoDB: {item_error}, item_id: {item_dict.get('questionId', {}).get('S')}",
+                    exc_info=True,
+                )
+                continue
+    parsed_count = len(problems)
+
+    if not problems:  # サンプリングはできたが、パースで全滅した場合
         logger.error(
-            "Failed to load or validate any question data after fetching and BatchGetItem, though IDs were selected."
+            "Failed to load or validate any question data after sampling, though items were selected."
         )
         raise ServiceError(
             status_code=500,
@@ -384,38 +572,121 @@ async def get_questions_from_dynamodb(
     return problems
 
 
-def shuffle_options(questions: List[ProblemData]) -> List[ProblemData]:
-    for q in questions:
-        if hasattr(q, "options") and q.options:
-            random.shuffle(q.options)
-    return questions
+async def _refill_problem_pool(
+    dynamodb_client: Any,
+    book_source: Literal["readable_code", "programming_principles", "both"],
+) -> List[ProblemData]:
+    """
+    bookSource の問題プールをDynamoDBから取得し直してキャッシュする。
+    同じ bookSource の取得が重ならないようロックを取り、待っている間に
+    別のリクエストが取得し終えていればそのプールを使う。
+    """
+    lock = _problem_pool_cache_locks.get(book_source)
+    if lock is None:
+        lock = _problem_pool_cache_locks[book_source] = asyncio.Lock()
+    async with lock:
+        cached = _problem_pool_cache.get(book_source)
+        if cached is not None and cached[0] > time.monotonic():
+            return cached[1]
+        try:
+            pool = await _fetch_problems_from_dynamodb(
+                dynamodb_client, book_source, PROBLEM_POOL_SIZE
+            )
+        except ServiceError:
+            # 取得に失敗したら古いプールも破棄し、次のリクエストで取得し直す
+            _problem_pool_cache.pop(book_source, None)
+            raise
+        # 複数コンテナのキャッシュが同時に切れないよう、有効期限に揺らぎを持たせる
+        expires_at = time.monotonic() + PROBLEM_POOL_CACHE_TTL_SECONDS * (
+            1 + _rng.random() * 0.2
+        )
+        _problem_pool_cache[book_source] = (expires_at, pool)
+        return pool
 
 
-async def store_session_data(
-    session_dynamodb_table: Annotated[Any, Depends(get_session_data_table)],
-    session_id: str,
+async def get_questions_from_dynamodb(
+    dynamodb_client: Annotated[Any, Depends(get_dynamodb_client)],
+    book_source: Literal["readable_code", "programming_principles", "both"],
+    count: int,
+) -> List[ProblemData]:
+    """
+    問題プールのキャッシュからcount件をランダムに選んで返す。
+    キャッシュがない、または期限切れの場合は多めのプールをDynamoDBから取得し直す。
+    """
+    if count <= 0:
+        return []
+
+    cached = _problem_pool_cache.get(book_source)
+    if cached is not None and cached[0] > time.monotonic():
+        pool = cached[1]
+    else:
+        pool = await _refill_problem_pool(dynamodb_client, book_source)
+
+    if len(pool) < count:
+        logger.warning(
+            f"Requested {count} questions, but only {len(pool)} unique questions available for source '{book_source}'."
+        )
+    return _rng.sample(pool, min(count, len(pool)))
+
+
+def build_session_and_response(
     problems: List[ProblemData],
-) -> None:
-    current_time = int(time.time())
-    ttl_timestamp = current_time + SESSION_TTL_SECONDS
+) -> Tuple[Dict[str, SessionDataItem], List[Question]]:
+    """
+    選択肢のシャッフル、セッション保存用データ、レスポンス用の問題リストを
+    問題リストの1パスでまとめて作成する。
+    """
     problem_data_map: Dict[str, SessionDataItem] = {}
+    response_questions: List[Question] = []
     for problem in problems:
-        explanation_text = None
-        if problem.explanation and hasattr(problem.explanation, "explanation"):
-            explanation_text = problem.explanation.explanation
-        problem_data_map[problem.questionId] = SessionDataItem(
+        # 問題はプールキャッシュで共有されているため、元のリストは並べ替えず、
+        # sample で作った並べ替え済みの新しいリストをセッションとレスポンスの両方で使う
+        options = _rng.sample(problem.options, len(problem.options))
+        # ProblemData 由来の検証済みの値だけなので、SessionDataItem も検証を省いて組み立てる
+        problem_data_map[problem.questionId] = SessionDataItem.model_construct(
             questionId=problem.questionId,
             correctAnswer=problem.correctAnswer,
             category=problem.category,
             question=problem.question,
-            options=[Option(id=opt.id, text=opt.text) for opt in problem.options],
-            explanation=explanation_text,
+            options=options,
+            explanation=problem.explanation.explanation,
+        )
+        # options は検証済みの Option をそのまま使い回す
+        response_questions.append(
+            Question.model_construct(
+                questionId=problem.questionId,
+                question=problem.question,
+                options=options,
+            )
         )
-    session_data = SessionData(problem_data=problem_data_map, ttl=ttl_timestamp)
+    return problem_data_map, response_questions
+
+
+async def store_session_data(
+    dynamodb_client: Annotated[Any, Depends(get_dynamodb_client)],
+    session_id: str,
+    problem_data_map: Dict[str, SessionDataItem],
+) -> None:
+    current_time = int(_now())
+    ttl_timestamp = current_time + SESSION_TTL_SECONDS
     try:
-        item_to_store = session_data.model_dump(mode="json")
-        item_to_store["sessionId"] = session_id
-        await session_dynamodb_table.put_item(Item=item_to_store)
+        # セッション全体をネストした Map ではなく、圧縮した JSON を1つのバイナリ属性として保存する
+        # problem_data_map の各要素は検証済みなので、SessionData は model_construct で組み立てる
+        session_data = SessionData.model_construct(
+            problem_data=problem_data_map, ttl=ttl_timestamp
+        )
+        data_blob = zlib.compress(
+            session_data.model_dump_json().encode("utf-8"),
+            SESSION_DATA_COMPRESSION_LEVEL,
+        )
+        await dynamodb_client.put_item(
+            TableName=settings.dynamodb_session_table_name,
+            Item={
+                "sessionId": {"S": session_id},
+                "ttl": {"N": str(ttl_timestamp)},
+                "data": {"B": data_blob},
+            },
+        )
     except ClientError as e:
         logger.error(
             f"Error storing session data to DynamoDB for {session_id}: {e}",
@@ -432,24 +703,57 @@ async def store_session_data(
         )
 
 
+def _construct_session_data_item(item_data: Dict[str, Any]) -> SessionDataItem:
+    return SessionDataItem.model_construct(
+        questionId=item_data["questionId"],
+        correctAnswer=item_data["correctAnswer"],
+        category=item_data.get("category"),
+        question=item_data["question"],
+        options=[
+            Option.model_construct(id=opt["id"], text=opt["text"])
+            for opt in item_data["options"]
+        ],
+        explanation=item_data.get("explanation"),
+    )
+
+
 async def get_session_data(
-    session_dynamodb_table: Annotated[Any, Depends(get_session_data_table)],
+    dynamodb_client: Annotated[Any, Depends(get_dynamodb_client)],
     session_id: str,
 ) -> Optional[SessionData]:
     try:
-        response = await session_dynamodb_table.get_item(Key={"sessionId": session_id})
-        item = response.get("Item")
-        if not item:
+        response = await dynamodb_client.get_item(
+            TableName=settings.dynamodb_session_table_name,
+            Key={"sessionId": {"S": session_id}},
+        )
+        raw_item = response.get("Item")
+        if not raw_item:
             logger.warning(f"Session data not found for sessionId: {session_id}")
             return None
-        current_time = int(time.time())
-        if "ttl" in item and item["ttl"] < current_time:
+        # 属性は ttl (N) と data (B) だけなので、TypeDeserializer を通さず直接読む
+        # (旧形式のアイテムも ttl は同じ N 属性で持っている)
+        ttl = int(raw_item["ttl"]["N"])
+        current_time = int(_now())
+        if ttl < current_time:
             logger.info(
-                f"Session {session_id} has expired (TTL: {item['ttl']}, Current: {current_time})."
+                f"Session {session_id} has expired (TTL: {ttl}, Current: {current_time})."
             )
             return None
-        validated_data = SessionData.model_validate(item)
-        return validated_data
+        if "data" not in raw_item:
+            # 圧縮形式に切り替える前に保存された、problem_data を Map 属性で持つ旧形式。
+            # SESSION_TTL_SECONDS が過ぎれば残っていないので、それまでの互換用に検証して読む
+            legacy_item = deserialize_dynamodb_item_fully(raw_item)
+            return SessionData.model_validate(
+                {"problem_data": legacy_item["problem_data"], "ttl": ttl}
+            )
+        # 自分で書き込んだデータなので再検証はせず model_construct で復元する。
+        # 必須フィールドは添字アクセスにして、壊れたデータは KeyError として検出する
+        stored_session = orjson.loads(zlib.decompress(raw_item["data"]["B"]))
+        problem_data = {
+            question_id: _construct_session_data_item(item_data)
+            for question_id, item_data in stored_session["problem_data"].items()
+        }
+        return SessionData.model_construct(problem_data=problem_data, ttl=ttl)
     except ClientError as e:
         logger.error(
             f"Failed to retrieve session data for {session_id} from DynamoDB: {e}",
@@ -467,29 +771,33 @@ async def get_session_data(
 def validate_answers(
     user_answers: List[Answer], session_data: SessionData
 ) -> List[Result]:
-    results = []
+    results: List[Result] = []
+    append_result = results.append
     correct_data_map = session_data.problem_data
     for user_ans in user_answers:
         q_id = user_ans.questionId
-        if q_id not in correct_data_map:
+        correct_item = correct_data_map.get(q_id)
+        if correct_item is None:
             logger.warning(
                 f"Question ID {q_id} from user answer not found in session data. Skipping."
             )
             continue
-        correct_info = correct_data_map[q_id]
-        is_correct = False
-        if user_ans.answer is not None:
-            is_correct = user_ans.answer == correct_info.correctAnswer
-        results.append(
-            Result(
+        # セッションデータは検証済みなので、フィールドは __dict__ から直接読み、Result も検証を省いて組み立てる
+        # options はセッションのリストをコピーせず参照のまま渡す (Option は frozen なので共有してよい)
+        correct_info = correct_item.__dict__
+        user_answer = user_ans.answer
+        correct_answer = correct_info["correctAnswer"]
+        append_result(
+            Result.model_construct(
                 questionId=q_id,
-                category=correct_info.category,
-                isCorrect=is_correct,
-                userAnswer=user_ans.answer,
-                correctAnswer=correct_info.correctAnswer,
-                question=correct_info.question,
-                options=correct_info.options,
-                explanation=correct_info.explanation,
+                category=correct_info["category"],
+                isCorrect=user_answer is not None and user_answer == correct_answer,
+                userAnswer=user_answer,
+                correctAnswer=correct_answer,
+                question=correct_info["question"],
+                options=correct_info["options"],
+                explanation=correct_info["explanation"],
+                displayOrder=user_ans.displayOrder,
             )
         )
     return results
@@ -506,20 +814,22 @@ async def get_quiz_questions(
         int, Query(ge=10, le=300, description="1問あたりの制限時間(秒)")
     ],
     dynamodb_client_injected: Annotated[Any, Depends(get_dynamodb_client)],
-    quiz_problems_table_injected: Annotated[Any, Depends(get_quiz_problems_table)],
-    session_data_table_injected: Annotated[Any, Depends(get_session_data_table)],
     request: Request,
 ):
     aws_request_id = "N/A"
     if "aws.lambda_context" in request.scope:
         aws_request_id = request.scope["aws.lambda_context"].aws_request_id
     logger.info(
-        f"[ReqID: {aws_request_id}] GET /questions: START - bookSource='{bookSource}', count={count}, timeLimitPerQuestion={timeLimit}"
+        "[ReqID: %s] GET /questions: START - bookSource='%s', count=%s, timeLimitPerQuestion=%s",
+        aws_request_id,
+        bookSource,
+        count,
+        timeLimit,
     )
 
     try:
         problems_from_db = await get_questions_from_dynamodb(
-            dynamodb_client_injected, quiz_problems_table_injected, bookSource, count
+            dynamodb_client_injected, bookSource, count
         )
 
         if (
@@ -536,29 +846,26 @@ async def get_quiz_questions(
                     detail=f"No questions could be loaded for source: {bookSource}. Please try a different source or smaller count.",
                 )
 
-        shuffled_problems = shuffle_options(problems_from_db)
-        session_id = f"sess_{uuid.uuid4()}"
-        await store_session_data(
-            session_data_table_injected, session_id, shuffled_problems
+        problem_data_map, response_questions = build_session_and_response(
+            problems_from_db
         )
-
-        response_questions = [
-            Question(
-                questionId=p.questionId,
-                question=p.question,
-                options=[Option(id=opt.id, text=opt.text) for opt in p.options],
+        session_id = "sess_" + secrets.token_urlsafe(16)
+        if problem_data_map:  # 問題が0件なら保存するセッションもない
+            await store_session_data(
+                dynamodb_client_injected, session_id, problem_data_map
             )
-            for p in shuffled_problems
-        ]
 
-        final_response = QuestionResponse(
+        # 自前で組み立てた検証済みデータなので、再検証せずに構築する
+        final_response = QuestionResponse.model_construct(
             questions=response_questions,
             timeLimit=timeLimit
             * len(response_questions),  # 問題数が0の場合、timeLimitも0になる
             sessionId=session_id,
         )
         logger.info(
-            f"[ReqID: {aws_request_id}] GET /questions: END - Successfully processed. Returning {len(response_questions)} questions."
+            "[ReqID: %s] GET /questions: END - Successfully processed. Returning %s questions.",
+            aws_request_id,
+            len(response_questions),
         )
         return final_response
     except ServiceError as e:
@@ -580,29 +887,37 @@ async def get_quiz_questions(
 @app.post("/answers", response_model=AnswerResponse)
 async def submit_answers(
     answer_request: Annotated[AnswerRequest, Body(description="ユーザーの解答")],
-    session_data_table_injected: Annotated[Any, Depends(get_session_data_table)],
+    dynamodb_client_injected: Annotated[Any, Depends(get_dynamodb_client)],
     request: Request,
 ):
     aws_request_id = "N/A"
     if "aws.lambda_context" in request.scope:
         aws_request_id = request.scope["aws.lambda_context"].aws_request_id
     logger.info(
-        f"[ReqID: {aws_request_id}] POST /answers: START - sessionId='{answer_request.sessionId}', num_answers={len(answer_request.answers)}"
+        "[ReqID: %s] POST /answers: START - sessionId='%s', num_answers=%s",
+        aws_request_id,
+        answer_request.sessionId,
+        len(answer_request.answers),
     )
 
     session_id = answer_request.sessionId
     user_answers = answer_request.answers
 
     try:
-        session_data = await get_session_data(session_data_table_injected, session_id)
+        session_data = await get_session_data(dynamodb_client_injected, session_id)
 
         if session_data is None:
             raise ServiceError(status_code=404, detail="Session not found or expired.")
 
         results = validate_answers(user_answers, session_data)
-        response = AnswerResponse(results=results)
+        # Result は自前で組み立てたものなので、response_model による再検証と
+        # jsonable_encoder を通さず、pydantic-core で直接 JSON にして返す
+        response = Response(
+            content=AnswerResponse.model_construct(results=results).model_dump_json(),
+            media_type="application/json",
+        )
         logger.info(
-            f"[ReqID: {aws_request_id}] POST /answers: END - Successfully processed."
+            "[ReqID: %s] POST /answers: END - Successfully processed.", aws_request_id
         )
         return response
     except ServiceError as e:
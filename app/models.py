@@ -1,8 +1,8 @@
 # app/models.py
-import uuid
+import secrets
 from typing import Any, Dict, List, Literal
 
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, ConfigDict, Field
 
 # --- API関連モデル ---
 
@@ -18,6 +18,9 @@ class QuestionRequestParams(BaseModel):
 class Option(BaseModel):
     """選択肢"""
 
+    # 保存済みの問題データでも使うため、未知の属性は拒否せずに無視する
+    model_config = ConfigDict(frozen=True)
+
     id: str
     text: str
 
@@ -35,14 +38,18 @@ class QuestionResponse(BaseModel):
 
     questions: List[Question]
     timeLimit: int  # 仕様書では "timeLimit" だが合計時間かもしれない totalTime?
-    sessionId: str = Field(default_factory=lambda: f"sess_{uuid.uuid4()}")
+    sessionId: str = Field(default_factory=lambda: "sess_" + secrets.token_urlsafe(16))
 
 
 class Answer(BaseModel):
     """ユーザーの解答"""
 
+    # リクエストボディなので未知のフィールドは従来どおり無視する (extra="forbid" にはしない)
+    model_config = ConfigDict(frozen=True)
+
     questionId: str
     answer: str | None = None  # 選択肢ID (例: "A",　未選択時は None)
+    displayOrder: List[str]  # ユーザーに表示した選択肢IDの順序
 
 
 class AnswerRequest(BaseModel):
@@ -55,6 +62,8 @@ class AnswerRequest(BaseModel):
 class Result(BaseModel):
     """採点結果"""
 
+    model_config = ConfigDict(frozen=True, extra="forbid")
+
     questionId: str
     category: str | None = None  # S3データから取得
     isCorrect: bool
@@ -63,6 +72,7 @@ class Result(BaseModel):
     question: str  # S3データから取得
     options: List[Option]  # S3データから取得 (ユーザーが見た表示順とは限らない)
     explanation: str | None = None  # S3データから取得
+    displayOrder: List[str]  # ユーザーに表示した選択肢IDの順序 (解答をそのまま返す)
 
 
 class AnswerResponse(BaseModel):
@@ -95,6 +105,8 @@ class ProblemData(BaseModel):
 class SessionDataItem(BaseModel):
     """DynamoDBに保存する各問題の情報 (簡易版)"""
 
+    model_config = ConfigDict(frozen=True)
+
     questionId: str
     correctAnswer: str
     category: str | None = None
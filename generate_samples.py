@@ -1,12 +1,15 @@
-import json
 import os
 import random  # ランダム要素を使う場合 (今回は固定パターンで生成)
+from concurrent.futures import ThreadPoolExecutor
+
+import orjson
 
 # --- 設定 ---
 NUM_TO_GENERATE_PER_CATEGORY = 29  # RC001/PP001 以外に生成する数
 OUTPUT_BASE_DIR = "sample_data/questions"  # 保存先ベースディレクトリ
 RC_DIR = os.path.join(OUTPUT_BASE_DIR, "readable_code")
 PP_DIR = os.path.join(OUTPUT_BASE_DIR, "programming_principles")
+WRITE_MAX_WORKERS = 16  # ファイル書き込みを並行させるスレッド数
 
 # --- ディレクトリ作成 ---
 os.makedirs(RC_DIR, exist_ok=True)
@@ -100,6 +103,14 @@ correct_answers_cycle = ["A", "B", "C", "D"]
 
 
 # --- ファイル生成関数 ---
+def write_json_file(filepath, json_bytes):
+    try:
+        with open(filepath, "wb") as f:
+            f.write(json_bytes)
+    except IOError as e:
+        print(f"Error writing file {filepath}: {e}")
+
+
 def generate_files(
     category_prefix,
     book_source,
@@ -111,6 +122,14 @@ def generate_files(
     output_dir,
 ):
     print(f"Generating sample data for {book_source}...")
+    files_to_write = []  # (ファイルパス, JSONバイト列) のリスト
+    # 選択肢テンプレートは "{}" の前後に分割しておき、ループ内では連結するだけにする
+    option_template_parts = {
+        opt_id: base_options[opt_id].split("{}") for opt_id in ["A", "B", "C", "D"]
+    }
+    # ダミーのページ番号に使う乱数は、ループの前にまとめて生成しておく
+    ref_page_multipliers = random.choices(range(2, 5), k=NUM_TO_GENERATE_PER_CATEGORY)
+    ref_page_spans = random.choices(range(1, 6), k=NUM_TO_GENERATE_PER_CATEGORY)
     for i in range(2, NUM_TO_GENERATE_PER_CATEGORY + 2):  # 002 から 030 まで
         q_id = f"{category_prefix}{i:03d}"
         topic_index = i - 2
@@ -123,15 +142,15 @@ def generate_files(
 
         question_text = base_question.format(topic)
         options = [
-            {"id": opt_id, "text": base_options[opt_id].format(topic)}
-            for opt_id in ["A", "B", "C", "D"]
+            {"id": opt_id, "text": prefix + topic + suffix}
+            for opt_id, (prefix, suffix) in option_template_parts.items()
         ]
         explanation_text = base_explanation.format(topic, correct_ans_id)
         # ダミーのページ番号
         ref_page_start = (50 if category_prefix == "RC" else 90) + (
-            i * random.randint(2, 4)
+            i * ref_page_multipliers[topic_index]
         )
-        ref_pages = f"{ref_page_start}-{ref_page_start + random.randint(1, 5)}"
+        ref_pages = f"{ref_page_start}-{ref_page_start + ref_page_spans[topic_index]}"
 
         data = {
             "questionId": q_id,
@@ -148,11 +167,15 @@ def generate_files(
         }
 
         filepath = os.path.join(output_dir, f"{q_id}.json")
-        try:
-            with open(filepath, "w", encoding="utf-8") as f:
-                json.dump(data, f, indent=2, ensure_ascii=False)
-        except IOError as e:
-            print(f"Error writing file {filepath}: {e}")
+        # orjson は常に UTF-8 で出力するので、ensure_ascii=False 相当になる
+        files_to_write.append(
+            (filepath, orjson.dumps(data, option=orjson.OPT_INDENT_2))
+        )
+
+    # 小さなファイルを大量に書くので、書き込みはスレッドプールでまとめて並行に行う
+    # 結果を読み切ることで、ワーカー内で起きた例外 (IOError 以外) もここで送出させる
+    with ThreadPoolExecutor(max_workers=WRITE_MAX_WORKERS) as executor:
+        list(executor.map(write_json_file, *zip(*files_to_write)))
 
     print(f"Generated {NUM_TO_GENERATE_PER_CATEGORY} sample files in {output_dir}")
 
@@ -1,14 +1,15 @@
 # tests/test_main_endpoints.py
-import uuid
+from types import SimpleNamespace
 from typing import Any, Dict, List
-from unittest.mock import AsyncMock, patch
+from unittest.mock import AsyncMock, MagicMock
 
+import httpx
+import orjson
 import pytest
-from fastapi.testclient import TestClient
+import pytest_asyncio
 
-from app.main import ServiceError, app
+from app.main import ServiceError, app, get_dynamodb_client, validate_answers
 from app.models import (
-    Answer,
     Explanation,
     Option,
     ProblemData,
@@ -17,69 +18,150 @@ from app.models import (
 )
 
 # パス定数
-MOCK_GET_QUESTIONS_S3 = "app.main.get_questions_from_s3"
+MOCK_GET_QUESTIONS = "app.main.get_questions_from_dynamodb"
 MOCK_STORE_SESSION = "app.main.store_session_data"
 MOCK_GET_SESSION = "app.main.get_session_data"
 MOCK_VALIDATE_ANSWERS = "app.main.validate_answers"
-MOCK_UUID = "app.main.uuid"
-MOCK_TIME = "app.main.time"
+MOCK_SECRETS = "app.main.secrets"
 
+_FIXED_TOKEN = "AbCdEfGhIjKlMnOpQrStUv"
+_EXPECTED_SESSION_ID = f"sess_{_FIXED_TOKEN}"
+# 期待するレスポンスボディはモジュール読み込み時に1度だけ作る
+_FETCH_ERROR_RESPONSE = {"detail": "DynamoDB Mock Error"}
+_SESSION_NOT_FOUND_RESPONSE = {"detail": "Session not found or expired."}
+_SESSION_READ_ERROR_RESPONSE = {"detail": "Database read error"}
+_ROOT_RESPONSE = {"message": "Quiz App Backend is running!"}
+_JSON_HEADERS = {"Content-Type": "application/json"}
+# GET /questions の基本のクエリパラメータ (テストごとに一部だけ上書きして使う)
+_QUESTIONS_PARAMS = {"bookSource": "readable_code", "count": 2, "timeLimit": 30}
 
-@pytest.fixture
-def client():
-    """テスト用APIクライアント"""
-    return TestClient(app)
+# 全テストをモジュール共有のイベントループ上で動かし、async_client を使い回す
+pytestmark = pytest.mark.asyncio(loop_scope="module")
 
 
-@pytest.fixture
-def dummy_problems():
-    """テスト用問題セット"""
-    return [create_dummy_problem("Q001"), create_dummy_problem("Q002")]
+class AsyncStub:
+    """
+    呼び出し引数を記録して return_value を返すだけの軽量な非同期スタブ。
+    AsyncMock のような呼び出しの検査機能が不要な、呼び出し回数の多いモックに使う。
+    """
+
+    def __init__(self):
+        self.calls: List[tuple] = []
+        self.return_value: Any = None
+        self.side_effect: BaseException | None = None
+
+    async def __call__(self, *args, **kwargs):
+        self.calls.append((args, kwargs))
+        if self.side_effect is not None:
+            raise self.side_effect
+        return self.return_value
+
+
+@pytest.fixture(autouse=True)
+def mocks(monkeypatch):
+    """
+    エンドポイントが使う DynamoDB 操作と secrets を、テストごとに新しいモックへ差し替える。
+    各テストは with patch(...) を使わず、このフィクスチャのモックに戻り値や例外を設定する。
+    validate_answers は実装を wraps しているので、side_effect を設定しない限り本物の採点が動く。
+    """
+    stubs = SimpleNamespace(
+        dynamodb_client=MagicMock(),
+        get_questions=AsyncStub(),
+        store=AsyncMock(),
+        get_session=AsyncMock(),
+        validate=MagicMock(wraps=validate_answers),
+        secrets=MagicMock(),
+    )
+    monkeypatch.setitem(
+        app.dependency_overrides, get_dynamodb_client, lambda: stubs.dynamodb_client
+    )
+    monkeypatch.setattr(MOCK_GET_QUESTIONS, stubs.get_questions)
+    monkeypatch.setattr(MOCK_STORE_SESSION, stubs.store)
+    monkeypatch.setattr(MOCK_GET_SESSION, stubs.get_session)
+    monkeypatch.setattr(MOCK_VALIDATE_ANSWERS, stubs.validate)
+    monkeypatch.setattr(MOCK_SECRETS, stubs.secrets)
+    return stubs
 
 
-@pytest.fixture
-def more_dummy_problems():
-    """より多くのテスト用問題セット"""
-    return [create_dummy_problem(f"Q{i:03d}") for i in range(1, 51)]
+@pytest_asyncio.fixture(scope="module", loop_scope="module")
+async def async_client():
+    """
+    テスト用APIクライアント。モジュール内の全テストで1つを共有する。
+    ASGITransport でテストと同じイベントループ上のアプリを直接呼び出す
+    (TestClient のようにリクエストごとに別スレッドを経由しない)。
+    モック関数の差し替えはテストごとに mocks フィクスチャが行うので、クライアントを共有しても各テストは独立している。
+    """
+    async with httpx.AsyncClient(
+        transport=httpx.ASGITransport(app=app), base_url="http://test"
+    ) as client:
+        yield client
+
+
+@pytest.fixture(scope="session")
+def dummy_problems():
+    """テスト用問題セット"""
+    return list(_ALL_DUMMY_PROBLEMS[:2])
 
 
-@pytest.fixture
-def fixed_uuid():
-    """固定UUID値 (有効な形式に修正)"""
-    # 標準的な UUID 形式 (32桁の16進数 + ハイフン)
-    return uuid.UUID("12345678-1234-5678-1234-567812345678")
+@pytest.fixture(scope="session")
+def fixed_token():
+    """固定トークン値 (secrets.token_urlsafe(16) と同じ22文字)"""
+    return _FIXED_TOKEN
 
 
-@pytest.fixture
-def expected_session_id(fixed_uuid):
-    """期待されるセッションID (str()不要)"""
-    return f"sess_{fixed_uuid}"
+@pytest.fixture(scope="session")
+def expected_session_id():
+    """期待されるセッションID"""
+    return _EXPECTED_SESSION_ID
 
 
 def create_dummy_problem(q_id: str, book_sorce: str = "readable_code") -> ProblemData:
-    """テスト用問題データ生成ヘルパー"""
-    return ProblemData(
+    """テスト用問題データ生成ヘルパー (固定のテストデータなので検証は省略する)"""
+    return ProblemData.model_construct(
         questionId=q_id,
         bookSource=book_sorce,
         category="test_cat",
         question=f"Question {q_id}",
-        options=[Option(id="A", text="A"), Option(id="B", text="B")],
+        options=[
+            Option.model_construct(id="A", text="A"),
+            Option.model_construct(id="B", text="B"),
+        ],
         correctAnswer="A",
-        explanation=Explanation(explanation=f"Expl {q_id}"),
+        explanation=Explanation.model_construct(explanation=f"Expl {q_id}"),
     )
 
 
-@pytest.fixture
+# 問題データはモジュール読み込み時に1度だけ作り、フィクスチャではそのコピーを返す
+_ALL_DUMMY_PROBLEMS = tuple(create_dummy_problem(f"Q{i:03d}") for i in range(1, 51))
+_DUMMY_PROBLEMS_BY_ID = {p.questionId: p for p in _ALL_DUMMY_PROBLEMS}
+
+
+@pytest.fixture(scope="session")
 def create_session_data():
     """
     カスタマイズ可能なセッションデータを作成するファクトリー関数
     """
 
+    # テストは返された SessionData を読むだけなので、同じ引数なら同じインスタンスを使い回す
+    session_data_cache: Dict[tuple, SessionData] = {}
+
     def _create_session_data(correct_answers=None, problems=None, ttl_offset=3600):
+        cache_key = (
+            frozenset(correct_answers.items()) if correct_answers is not None else None,
+            tuple(p.questionId for p in problems) if problems is not None else None,
+            ttl_offset,
+        )
+        cached = session_data_cache.get(cache_key)
+        if cached is not None:
+            return cached
+
         if correct_answers is None and problems is None:
             correct_answers = {"Q001": "A", "Q002": "A"}
         elif correct_answers is not None and problems is None:
-            problems = [create_dummy_problem(qid) for qid in correct_answers]
+            problems = [
+                _DUMMY_PROBLEMS_BY_ID.get(qid) or create_dummy_problem(qid)
+                for qid in correct_answers
+            ]
         elif problems is not None:
             if correct_answers is None:
                 correct_answers = {p.questionId: p.correctAnswer for p in problems}
@@ -105,7 +187,9 @@ def create_session_data():
             1743889703  # 例: 2025-04-07 13:28:23 JST (これは実行時の現在時刻とは異なる)
         )
         ttl = current_time + ttl_offset
-        return SessionData(problem_data=problem_data, ttl=ttl)
+        session_data = SessionData(problem_data=problem_data, ttl=ttl)
+        session_data_cache[cache_key] = session_data
+        return session_data
 
     return _create_session_data
 
@@ -113,6 +197,18 @@ def create_session_data():
 # --- Helper Functions for Validation ---
 
 
+def _assert_session_fetched(mocks: SimpleNamespace, session_id: str):
+    """get_session_data が注入されたクライアントと session_id で1回だけ呼ばれたことを確認する"""
+    assert mocks.get_session.await_count == 1
+    assert mocks.get_session.call_args.args == (mocks.dynamodb_client, session_id)
+
+
+def _setup_happy_path(mocks: SimpleNamespace, problems: List[ProblemData], token: str):
+    """GET /questions の正常系: 問題取得とセッションIDのトークンを固定する"""
+    mocks.secrets.token_urlsafe.return_value = token
+    mocks.get_questions.return_value = problems
+
+
 def validate_answer_results(
     data: Dict[str, Any], expected_results: List[Dict[str, Any]]
 ):
@@ -133,8 +229,8 @@ def validate_answer_results(
 
     for expected in expected_results:
         qid = expected["questionId"]
-        assert qid in results_dict, f"Question ID {qid} not found in results"
-        result = results_dict[qid]
+        result = results_dict.get(qid)
+        assert result is not None, f"Question ID {qid} not found in results"
 
         assert result["isCorrect"] == expected["isCorrect"], (
             f"Mismatch isCorrect for {qid}"
@@ -157,63 +253,48 @@ def validate_answer_results(
 # --- Test GET /questions ---
 
 
-@pytest.mark.asyncio
 async def test_get_questions_success(
-    client, dummy_problems, fixed_uuid, expected_session_id
+    async_client, mocks, dummy_problems, fixed_token, expected_session_id
 ):
     """
     GET /questions エンドポイントの成功ケースをテストします。
-    AsyncMock の使用を修正。
     """
-    with (
-        patch(MOCK_UUID) as mock_uuid,
-        # get_questions_from_s3 は async def なので AsyncMock を使用
-        patch(MOCK_GET_QUESTIONS_S3, new_callable=AsyncMock) as mock_get_s3,
-        # store_session_data は def なので MagicMock (デフォルト) で良い
-        patch(MOCK_STORE_SESSION) as mock_store,
-    ):
-        mock_uuid.uuid4.return_value = fixed_uuid
-        mock_get_s3.return_value = dummy_problems  # AsyncMock の return_value
-
-        response = client.get(
-            "/questions?bookSource=readable_code&count=2&timeLimit=30"
-        )
+    _setup_happy_path(mocks, dummy_problems, fixed_token)
 
-        assert response.status_code == 200
-        data = response.json()
+    response = await async_client.get("/questions", params=_QUESTIONS_PARAMS)
+
+    assert response.status_code == 200
+    data = response.json()
+
+    assert "questions" in data
+    assert "timeLimit" in data
+    assert "sessionId" in data
+    assert data["sessionId"] == expected_session_id
+    assert len(data["questions"]) == 2
+    assert data["timeLimit"] == 30 * 2
+
+    q1_resp = next((q for q in data["questions"] if q["questionId"] == "Q001"), None)
+    q2_resp = next((q for q in data["questions"] if q["questionId"] == "Q002"), None)
+    assert q1_resp is not None
+    assert q2_resp is not None
+    assert "correctAnswer" not in q1_resp
+    assert "explanation" not in q1_resp
+    assert "options" in q1_resp
+
+    assert mocks.get_questions.calls == [
+        ((mocks.dynamodb_client, "readable_code", 2), {})
+    ]
+    # セッションはレスポンスを返す前に保存される
+    mocks.store.assert_awaited_once()
+    call_args = mocks.store.call_args[0]
+    assert call_args[0] is mocks.dynamodb_client
+    assert call_args[1] == expected_session_id
+    assert set(call_args[2]) == {"Q001", "Q002"}
+    assert all(isinstance(item, SessionDataItem) for item in call_args[2].values())
 
-        assert "questions" in data
-        assert "timeLimit" in data
-        assert "sessionId" in data
-        assert data["sessionId"] == expected_session_id
-        assert len(data["questions"]) == 2
-        assert data["timeLimit"] == 30 * 2
 
-        q1_resp = next(
-            (q for q in data["questions"] if q["questionId"] == "Q001"), None
-        )
-        q2_resp = next(
-            (q for q in data["questions"] if q["questionId"] == "Q002"), None
-        )
-        assert q1_resp is not None
-        assert q2_resp is not None
-        assert "correctAnswer" not in q1_resp
-        assert "explanation" not in q1_resp
-        assert "options" in q1_resp
-
-        # AsyncMock の呼び出し検証
-        mock_get_s3.assert_awaited_once_with("readable_code", 2)
-        # MagicMock の呼び出し検証
-        mock_store.assert_called_once()
-        call_args = mock_store.call_args[0]
-        assert call_args[0] == expected_session_id
-        assert len(call_args[1]) == 2
-        assert {p.questionId for p in call_args[1]} == {"Q001", "Q002"}
-
-
-@pytest.mark.asyncio
 @pytest.mark.parametrize(
-    "book_source, expected_s3_call",
+    "book_source, expected_fetch_call",
     [
         ("readable_code", ("readable_code", 2)),
         ("programming_principles", ("programming_principles", 2)),
@@ -221,149 +302,125 @@ async def test_get_questions_success(
     ],
 )
 async def test_get_questions_booksource_param(
-    client,
+    async_client,
+    mocks,
     dummy_problems,
-    fixed_uuid,
+    fixed_token,
     expected_session_id,
     book_source,
-    expected_s3_call,
+    expected_fetch_call,
 ):
-    """GET /questions: bookSource パラメータによる S3 呼び出しの変化をテスト"""
-    with (
-        patch(MOCK_UUID) as mock_uuid,
-        patch(MOCK_GET_QUESTIONS_S3, new_callable=AsyncMock) as mock_get_s3,
-        patch(MOCK_STORE_SESSION) as mock_store,
-    ):
-        mock_uuid.uuid4.return_value = fixed_uuid
-        mock_get_s3.return_value = dummy_problems
-
-        response = client.get(
-            f"/questions?bookSource={book_source}&count=2&timeLimit=30"
-        )
+    """GET /questions: bookSource パラメータによる問題取得呼び出しの変化をテスト"""
+    _setup_happy_path(mocks, dummy_problems, fixed_token)
 
-        assert response.status_code == 200
-        mock_get_s3.assert_awaited_once_with(*expected_s3_call)
-        mock_store.assert_called_once()
+    response = await async_client.get(
+        "/questions", params={**_QUESTIONS_PARAMS, "bookSource": book_source}
+    )
+
+    assert response.status_code == 200
+    assert mocks.get_questions.calls == [
+        ((mocks.dynamodb_client, *expected_fetch_call), {})
+    ]
+    mocks.store.assert_awaited_once()
 
 
-@pytest.mark.asyncio
 @pytest.mark.parametrize("count", [1, 50])
 async def test_get_questions_count_boundary(
-    client, more_dummy_problems, fixed_uuid, expected_session_id, count
+    async_client, mocks, fixed_token, expected_session_id, count
 ):
     """
     GET /questions: count パラメータの境界値をテスト
     """
-    with (
-        patch(MOCK_UUID) as mock_uuid,
-        patch(MOCK_GET_QUESTIONS_S3, new_callable=AsyncMock) as mock_get_s3,
-        patch(MOCK_STORE_SESSION) as mock_store,
-    ):
-        mock_uuid.uuid4.return_value = fixed_uuid
-        mock_get_s3.return_value = more_dummy_problems[:count]
+    _setup_happy_path(mocks, list(_ALL_DUMMY_PROBLEMS[:count]), fixed_token)
 
-        response = client.get(f"/questions?bookSource=both&count={count}&timeLimit=30")
+    response = await async_client.get(
+        "/questions", params={**_QUESTIONS_PARAMS, "bookSource": "both", "count": count}
+    )
 
-        assert response.status_code == 200
-        data = response.json()
-        assert len(data["questions"]) == count
-        mock_get_s3.assert_awaited_once_with("both", count)
-        mock_store.assert_called_once()
-        assert len(mock_store.call_args[0][1]) == count
+    assert response.status_code == 200
+    data = response.json()
+    assert len(data["questions"]) == count
+    assert mocks.get_questions.calls == [((mocks.dynamodb_client, "both", count), {})]
+    mocks.store.assert_awaited_once()
+    assert len(mocks.store.call_args[0][2]) == count
 
 
-@pytest.mark.asyncio
 @pytest.mark.parametrize(
     "time_limit_per_q, expected_total_time", [(10, 10 * 2), (300, 300 * 2)]
 )
 async def test_get_questions_timelimit_boundary(
-    client,
+    async_client,
+    mocks,
     dummy_problems,
-    fixed_uuid,
+    fixed_token,
     expected_session_id,
     time_limit_per_q,
     expected_total_time,
 ):
     """GET /questions: timeLimit パラメータの境界値をテスト"""
-    with (
-        patch(MOCK_UUID) as mock_uuid,
-        patch(MOCK_GET_QUESTIONS_S3, new_callable=AsyncMock) as mock_get_s3,
-        patch(MOCK_STORE_SESSION) as mock_store,
-    ):
-        mock_uuid.uuid4.return_value = fixed_uuid
-        mock_get_s3.return_value = dummy_problems
-
-        response = client.get(
-            f"/questions?bookSource=both&count=2&timeLimit={time_limit_per_q}"
-        )
+    _setup_happy_path(mocks, dummy_problems, fixed_token)
+
+    response = await async_client.get(
+        "/questions",
+        params={
+            **_QUESTIONS_PARAMS,
+            "bookSource": "both",
+            "timeLimit": time_limit_per_q,
+        },
+    )
+
+    assert response.status_code == 200
+    data = response.json()
+    assert data["timeLimit"] == expected_total_time
+    assert mocks.get_questions.calls == [((mocks.dynamodb_client, "both", 2), {})]
+    mocks.store.assert_awaited_once()
 
-        assert response.status_code == 200
-        data = response.json()
-        assert data["timeLimit"] == expected_total_time
-        mock_get_s3.assert_awaited_once_with("both", 2)
-        mock_store.assert_called_once()
-
-
-@pytest.mark.asyncio
-async def test_get_questions_no_problems_found(client, fixed_uuid):
-    """GET /questions: S3から問題が見つからないケース (404)"""
-    with (
-        patch(MOCK_UUID) as mock_uuid,
-        patch(MOCK_GET_QUESTIONS_S3, new_callable=AsyncMock) as mock_get_s3,
-        patch(MOCK_STORE_SESSION) as mock_store,
-    ):
-        mock_uuid.uuid4.return_value = fixed_uuid
-        mock_get_s3.return_value = []  # 空リストを返す
-
-        response = client.get(
-            "/questions?bookSource=readable_code&count=5&timeLimit=30"
-        )
 
-        assert response.status_code == 404
-        assert "No questions could be loaded" in response.json()["detail"]
-        mock_get_s3.assert_awaited_once_with("readable_code", 5)
-        mock_store.assert_not_called()
+async def test_get_questions_no_problems_found(async_client, mocks, fixed_token):
+    """GET /questions: DynamoDBから問題が見つからないケース (404)"""
+    mocks.secrets.token_urlsafe.return_value = fixed_token
+    mocks.get_questions.return_value = []  # 空リストを返す
 
+    response = await async_client.get(
+        "/questions", params={**_QUESTIONS_PARAMS, "count": 5}
+    )
 
-@pytest.mark.asyncio
-async def test_get_questions_s3_error(client):
-    """GET /questions: S3からの取得失敗 (500)"""
-    with patch(MOCK_GET_QUESTIONS_S3, new_callable=AsyncMock) as mock_get_s3:
-        # AsyncMock の side_effect にエラーを設定
-        mock_get_s3.side_effect = ServiceError(status_code=500, detail="S3 Mock Error")
+    assert response.status_code == 404
+    assert "No questions could be loaded" in response.json()["detail"]
+    assert mocks.get_questions.calls == [
+        ((mocks.dynamodb_client, "readable_code", 5), {})
+    ]
+    mocks.store.assert_not_awaited()
 
-        response = client.get(
-            "/questions?bookSource=readable_code&count=2&timeLimit=30"
-        )
 
-        assert response.status_code == 500
-        assert response.json() == {"detail": "S3 Mock Error"}
+async def test_get_questions_fetch_error(async_client, mocks):
+    """GET /questions: DynamoDBからの取得失敗 (500)"""
+    mocks.get_questions.side_effect = ServiceError(
+        status_code=500, detail=_FETCH_ERROR_RESPONSE["detail"]
+    )
+
+    response = await async_client.get("/questions", params=_QUESTIONS_PARAMS)
+
+    assert response.status_code == 500
+    assert response.json() == _FETCH_ERROR_RESPONSE
 
 
-@pytest.mark.asyncio
-async def test_get_questions_db_error(client, fixed_uuid, dummy_problems):
+async def test_get_questions_db_error(async_client, mocks, fixed_token, dummy_problems):
     """GET /questions: DBへの保存失敗 (500)"""
-    with (
-        patch(MOCK_UUID) as mock_uuid,
-        patch(MOCK_GET_QUESTIONS_S3, new_callable=AsyncMock) as mock_get_s3,
-        patch(MOCK_STORE_SESSION) as mock_store,
-    ):
-        mock_uuid.uuid4.return_value = fixed_uuid
-        mock_get_s3.return_value = dummy_problems
-        # store_session_data (同期関数) のモックにエラーを設定
-        mock_store.side_effect = ServiceError(status_code=500, detail="Database error")
-
-        response = client.get(
-            "/questions?bookSource=readable_code&count=2&timeLimit=30"
-        )
+    _setup_happy_path(mocks, dummy_problems, fixed_token)
+    # store_session_data のモックにエラーを設定
+    mocks.store.side_effect = ServiceError(status_code=500, detail="Database error")
+
+    response = await async_client.get("/questions", params=_QUESTIONS_PARAMS)
 
-        assert response.status_code == 500
-        assert response.json() == {"detail": "Database error"}
-        mock_get_s3.assert_awaited_once_with("readable_code", 2)
-        mock_store.assert_called_once()
+    assert response.status_code == 500
+    assert response.json() == {"detail": "Database error"}
+    assert mocks.get_questions.calls == [
+        ((mocks.dynamodb_client, "readable_code", 2), {})
+    ]
+    mocks.store.assert_awaited_once()
 
 
-@pytest.mark.asyncio
 @pytest.mark.parametrize(
     "param, value",
     [
@@ -374,450 +431,403 @@ async def test_get_questions_db_error(client, fixed_uuid, dummy_problems):
         ("bookSource", "invalid_source"),
     ],
 )
-async def test_get_questions_invalid_params(client, param, value):
+async def test_get_questions_invalid_params(async_client, param, value):
     """GET /questions: 無効なパラメータ (422)"""
-    params = {"bookSource": "readable_code", "count": "2", "timeLimit": "30"}
-    params[param] = str(value)
-    url = f"/questions?{'&'.join(f'{k}={v}' for k, v in params.items())}"
-
-    response = client.get(url)
+    response = await async_client.get(
+        "/questions", params={**_QUESTIONS_PARAMS, param: value}
+    )
     assert response.status_code == 422
 
 
 # --- Test POST /answers ---
 
 
-@pytest.mark.asyncio
-async def test_post_answers_success(client, create_session_data):
-    """POST /answers: 成功ケース (正解/不正解混在)"""
-    # get_session_data は同期関数なので MagicMock (デフォルト)
-    with patch(MOCK_GET_SESSION) as mock_get_session:
-        session_id = "test-session-xyz"
-        session_data = create_session_data(correct_answers={"Q001": "A", "Q002": "A"})
-        mock_get_session.return_value = session_data
-
-        request_body = {
-            "sessionId": session_id,
-            "answers": [
-                {"questionId": "Q001", "answer": "A", "displayOrder": ["A", "B"]},  # 正
-                {"questionId": "Q002", "answer": "B", "displayOrder": ["B", "A"]},  # 誤
-            ],
-        }
-        response = client.post("/answers", json=request_body)
+def _answer_item(q_id: str, answer: str) -> Dict[str, Any]:
+    return {"questionId": q_id, "answer": answer, "displayOrder": ["A", "B"]}
+
+
+def _answers_body(session_id: str, answers: List[Dict[str, Any]]) -> bytes:
+    return orjson.dumps({"sessionId": session_id, "answers": answers})
+
+
+async def _post_answers(async_client: httpx.AsyncClient, body: bytes) -> httpx.Response:
+    """シリアライズ済みのボディで POST /answers を呼ぶ"""
+    return await async_client.post("/answers", content=body, headers=_JSON_HEADERS)
 
-        assert response.status_code == 200
-        data = response.json()
-        validate_answer_results(
-            data,
-            [
-                {
-                    "questionId": "Q001",
-                    "isCorrect": True,
-                    "userAnswer": "A",
-                    "correctAnswer": "A",
-                },
-                {
-                    "questionId": "Q002",
-                    "isCorrect": False,
-                    "userAnswer": "B",
-                    "correctAnswer": "A",
-                },
-            ],
-        )
-        mock_get_session.assert_called_once_with(session_id)
-
-
-@pytest.mark.asyncio
-async def test_post_answers_all_correct(client, create_session_data):
-    """POST /answers: 全問正解ケース"""
-    with patch(MOCK_GET_SESSION) as mock_get_session:
-        session_id = "test-session-all-correct"
-        session_data = create_session_data({"Q001": "A", "Q002": "B"})
-        mock_get_session.return_value = session_data
-
-        request_body = {
-            "sessionId": session_id,
-            "answers": [
-                {"questionId": "Q001", "answer": "A", "displayOrder": ["A", "B"]},
-                {"questionId": "Q002", "answer": "B", "displayOrder": ["A", "B"]},
-            ],
-        }
-        response = client.post("/answers", json=request_body)
 
-        assert response.status_code == 200
-        data = response.json()
-        validate_answer_results(
-            data,
+# POST /answers のリクエストボディは、モジュール読み込み時に1度だけ JSON バイト列にしておく
+# (キーはセッションID。各テストはこの中から自分のボディを引く)
+_ANSWER_BODIES = {
+    session_id: _answers_body(session_id, answers)
+    for session_id, answers in [
+        ("non-existent-session", [_answer_item("Q001", "A")]),
+        ("expired-session", [_answer_item("Q001", "A")]),
+        ("test-session-db-error", [_answer_item("Q001", "A")]),
+        ("test-session-empty-answers", []),
+        (
+            "test-session-duplicate-qid",
             [
-                {
-                    "questionId": "Q001",
-                    "isCorrect": True,
-                    "userAnswer": "A",
-                    "correctAnswer": "A",
-                },
-                {
-                    "questionId": "Q002",
-                    "isCorrect": True,
-                    "userAnswer": "B",
-                    "correctAnswer": "B",
-                },
+                _answer_item("Q001", "A"),  # 正
+                _answer_item("Q002", "B"),  # 正
+                _answer_item("Q001", "B"),  # 誤 (Q001 再度)
             ],
-        )
-        mock_get_session.assert_called_once_with(session_id)
-
-
-@pytest.mark.asyncio
-async def test_post_answers_all_incorrect(client, create_session_data):
-    """POST /answers: 全問不正解ケース"""
-    with patch(MOCK_GET_SESSION) as mock_get_session:
-        session_id = "test-session-all-incorrect"
-        session_data = create_session_data({"Q001": "A", "Q002": "A"})
-        mock_get_session.return_value = session_data
-
-        request_body = {
-            "sessionId": session_id,
-            "answers": [
-                {"questionId": "Q001", "answer": "B", "displayOrder": ["A", "B"]},
-                {"questionId": "Q002", "answer": "B", "displayOrder": ["A", "B"]},
-            ],
-        }
-        response = client.post("/answers", json=request_body)
-
-        assert response.status_code == 200
-        data = response.json()
-        validate_answer_results(
-            data,
+        ),
+        ("test-session-invalid-answer", [_answer_item("Q001", "C")]),  # 不正解
+        (
+            "test-session-missing-answer",
+            [{"questionId": "Q001", "displayOrder": ["A", "B"]}],  # 未解答
+        ),
+        (
+            "test-session-unknown-qid",
             [
-                {
-                    "questionId": "Q001",
-                    "isCorrect": False,
-                    "userAnswer": "B",
-                    "correctAnswer": "A",
-                },
-                {
-                    "questionId": "Q002",
-                    "isCorrect": False,
-                    "userAnswer": "B",
-                    "correctAnswer": "A",
-                },
+                _answer_item("Q001", "A"),  # 存在する
+                _answer_item("Q999", "B"),  # 存在しない
             ],
-        )
-        mock_get_session.assert_called_once_with(session_id)
+        ),
+        ("test-session-empty-problem-data", [_answer_item("Q001", "A")]),
+        ("test-session-validate-error", [_answer_item("Q001", "A")]),
+    ]
+}
+
+_MATRIX_SESSION_ID = "test-session-xyz"
+
+# 各ケース: (セッションの正解, ユーザーの解答, 期待される (questionId, 正誤) のリスト,
+#           シリアライズ済みのリクエストボディ)
+POST_ANSWERS_CASES = [
+    pytest.param(
+        correct_answers,
+        user_answers,
+        expected_correctness,
+        _answers_body(
+            _MATRIX_SESSION_ID,
+            [_answer_item(q_id, answer) for q_id, answer in user_answers.items()],
+        ),
+        id=case_id,
+    )
+    for case_id, correct_answers, user_answers, expected_correctness in [
+        (
+            "mixed",
+            {"Q001": "A", "Q002": "A"},
+            {"Q001": "A", "Q002": "B"},
+            [("Q001", True), ("Q002", False)],
+        ),
+        (
+            "all_correct",
+            {"Q001": "A", "Q002": "B"},
+            {"Q001": "A", "Q002": "B"},
+            [("Q001", True), ("Q002", True)],
+        ),
+        (
+            "all_incorrect",
+            {"Q001": "A", "Q002": "A"},
+            {"Q001": "B", "Q002": "B"},
+            [("Q001", False), ("Q002", False)],
+        ),
+    ]
+]
 
 
-@pytest.mark.asyncio
-async def test_post_answers_session_not_found(client):
+@pytest.mark.parametrize(
+    "correct_answers, user_answers, expected_correctness, request_body",
+    POST_ANSWERS_CASES,
+)
+async def test_post_answers_matrix(
+    async_client,
+    mocks,
+    create_session_data,
+    correct_answers,
+    user_answers,
+    expected_correctness,
+    request_body,
+):
+    """POST /answers: 成功ケース (正解/不正解混在・全問正解・全問不正解)"""
+    session_data = create_session_data(correct_answers=correct_answers)
+    mocks.get_session.return_value = session_data
+
+    response = await _post_answers(async_client, request_body)
+
+    assert response.status_code == 200
+    validate_answer_results(
+        response.json(),
+        [
+            {
+                "questionId": q_id,
+                "isCorrect": is_correct,
+                "userAnswer": user_answers[q_id],
+                "correctAnswer": correct_answers[q_id],
+            }
+            for q_id, is_correct in expected_correctness
+        ],
+    )
+    _assert_session_fetched(mocks, _MATRIX_SESSION_ID)
+
+
+async def test_post_answers_session_not_found(async_client, mocks):
     """POST /answers: セッションが見つからない (404)"""
-    with patch(MOCK_GET_SESSION) as mock_get_session:
-        mock_get_session.return_value = None
-        session_id = "non-existent-session"
-        request_body = {
-            "sessionId": session_id,
-            "answers": [
-                {"questionId": "Q001", "answer": "A", "displayOrder": ["A", "B"]}
-            ],
-        }
-        response = client.post("/answers", json=request_body)
+    mocks.get_session.return_value = None
+    session_id = "non-existent-session"
+    response = await _post_answers(async_client, _ANSWER_BODIES[session_id])
 
-        assert response.status_code == 404
-        assert response.json() == {"detail": "Session not found or expired."}
-        mock_get_session.assert_called_once_with(session_id)
+    assert response.status_code == 404
+    assert response.json() == _SESSION_NOT_FOUND_RESPONSE
+    _assert_session_fetched(mocks, session_id)
 
 
-@pytest.mark.asyncio
-async def test_post_answers_session_expired(client, create_session_data):
+async def test_post_answers_session_expired(async_client, mocks, create_session_data):
     """POST /answers: セッション期限切れ (404)"""
-    with patch(MOCK_GET_SESSION) as mock_get_session:
-        # TTLチェックでNoneが返ることをシミュレート
-        mock_get_session.return_value = None
-        session_id = "expired-session"
-        request_body = {
-            "sessionId": session_id,
-            "answers": [
-                {"questionId": "Q001", "answer": "A", "displayOrder": ["A", "B"]}
-            ],
-        }
-        response = client.post("/answers", json=request_body)
+    # TTLチェックでNoneが返ることをシミュレート
+    mocks.get_session.return_value = None
+    session_id = "expired-session"
+    response = await _post_answers(async_client, _ANSWER_BODIES[session_id])
 
-        assert response.status_code == 404
-        assert response.json() == {"detail": "Session not found or expired."}
-        mock_get_session.assert_called_once_with(session_id)
+    assert response.status_code == 404
+    assert response.json() == _SESSION_NOT_FOUND_RESPONSE
+    _assert_session_fetched(mocks, session_id)
 
 
-@pytest.mark.asyncio
-async def test_get_session_data_error(client):
+async def test_get_session_data_error(async_client, mocks):
     """
     POST /answers: get_session_data がServiceErrorを発生させるケース (500)
     【追加されたテストケース】
     """
-    with patch(MOCK_GET_SESSION) as mock_get_session:
-        session_id = "test-session-db-error"
-        # get_session_data (同期関数) のモックにエラーを設定
-        mock_get_session.side_effect = ServiceError(
-            status_code=500, detail="Database read error"
-        )
-
-        request_body = {
-            "sessionId": session_id,
-            "answers": [
-                {"questionId": "Q001", "answer": "A", "displayOrder": ["A", "B"]}
-            ],
-        }
-
-        response = client.post("/answers", json=request_body)
-
-        assert response.status_code == 500
-        assert response.json() == {"detail": "Database read error"}
-        mock_get_session.assert_called_once_with(session_id)
-
+    session_id = "test-session-db-error"
+    # get_session_data のモックにエラーを設定
+    mocks.get_session.side_effect = ServiceError(
+        status_code=500, detail=_SESSION_READ_ERROR_RESPONSE["detail"]
+    )
 
-@pytest.mark.asyncio
-@pytest.mark.parametrize(
-    "invalid_body",
-    [
-        {
-            "answers": [
-                {"questionId": "Q001", "answer": "A", "displayOrder": ["A", "B"]}
-            ]
-        },
-        {"sessionId": "test-session"},
-        {
-            "sessionId": "test-session",
-            "answers": [{"answer": "A", "displayOrder": ["A", "B"]}],
-        },
-        {
-            "sessionId": "test-session",
-            "answers": [{"questionId": "Q001", "displayOrder": ["A", "B"]}],
-        },
-        {
-            "sessionId": "test-session",
-            "answers": [{"questionId": "Q001", "answer": "A"}],
-        },
-        {"sessionId": "test-session", "answers": "not_a_list"},
-        {"sessionId": "test-session", "answers": ["not_a_dict"]},
-    ],
-)
-async def test_post_answers_validation_error(client, invalid_body):
+    response = await _post_answers(async_client, _ANSWER_BODIES[session_id])
+
+    assert response.status_code == 500
+    assert response.json() == _SESSION_READ_ERROR_RESPONSE
+    _assert_session_fetched(mocks, session_id)
+
+
+# 無効なリクエストボディは、モジュール読み込み時に1度だけ JSON バイト列にしておく
+_INVALID_ANSWER_BODIES = [
+    pytest.param(orjson.dumps(body), id=case_id)
+    for case_id, body in [
+        (
+            "missing_session_id",
+            {
+                "answers": [
+                    {"questionId": "Q001", "answer": "A", "displayOrder": ["A", "B"]}
+                ]
+            },
+        ),
+        ("missing_answers", {"sessionId": "test-session"}),
+        (
+            "missing_question_id",
+            {
+                "sessionId": "test-session",
+                "answers": [{"answer": "A", "displayOrder": ["A", "B"]}],
+            },
+        ),
+        (
+            "missing_display_order",
+            {
+                "sessionId": "test-session",
+                "answers": [{"questionId": "Q001", "answer": "A"}],
+            },
+        ),
+        ("answers_not_list", {"sessionId": "test-session", "answers": "not_a_list"}),
+        ("answer_not_dict", {"sessionId": "test-session", "answers": ["not_a_dict"]}),
+    ]
+]
+
+
+@pytest.mark.parametrize("invalid_body", _INVALID_ANSWER_BODIES)
+async def test_post_answers_validation_error(async_client, invalid_body):
     """POST /answers: 無効なリクエストボディ (422)"""
-    response = client.post("/answers", json=invalid_body)
+    response = await _post_answers(async_client, invalid_body)
     assert response.status_code == 422
 
 
-@pytest.mark.asyncio
-async def test_post_answers_empty_answers_list(client, create_session_data):
+async def test_post_answers_empty_answers_list(
+    async_client, mocks, create_session_data
+):
     """POST /answers: answers リストが空の場合 (200 OK, 空 results)"""
-    with patch(MOCK_GET_SESSION) as mock_get_session:
-        session_id = "test-session-empty-answers"
-        session_data = create_session_data({"Q001": "A"})
-        mock_get_session.return_value = session_data
+    session_id = "test-session-empty-answers"
+    session_data = create_session_data({"Q001": "A"})
+    mocks.get_session.return_value = session_data
 
-        request_body = {"sessionId": session_id, "answers": []}
-        response = client.post("/answers", json=request_body)
+    response = await _post_answers(async_client, _ANSWER_BODIES[session_id])
 
-        assert response.status_code == 200
-        data = response.json()
-        assert "results" in data
-        assert data["results"] == []
-        mock_get_session.assert_called_once_with(session_id)
+    assert response.status_code == 200
+    data = response.json()
+    assert "results" in data
+    assert data["results"] == []
+    _assert_session_fetched(mocks, session_id)
 
 
-@pytest.mark.asyncio
-async def test_post_answers_duplicate_question_id(client, create_session_data):
+async def test_post_answers_duplicate_question_id(
+    async_client, mocks, create_session_data
+):
     """POST /answers: 重複する questionId がある場合 (両方処理される)"""
-    with patch(MOCK_GET_SESSION) as mock_get_session:
-        session_id = "test-session-duplicate-qid"
-        session_data = create_session_data({"Q001": "A", "Q002": "B"})
-        mock_get_session.return_value = session_data
-
-        request_body = {
-            "sessionId": session_id,
-            "answers": [
-                {"questionId": "Q001", "answer": "A", "displayOrder": ["A", "B"]},  # 正
-                {"questionId": "Q002", "answer": "B", "displayOrder": ["A", "B"]},  # 正
-                {
-                    "questionId": "Q001",
-                    "answer": "B",
-                    "displayOrder": ["A", "B"],
-                },  # 誤 (Q001 再度)
-            ],
-        }
-        response = client.post("/answers", json=request_body)
-
-        assert response.status_code == 200
-        data = response.json()
-        # validate_answer_results は重複IDに対応していないため、手動で検証
-        assert "results" in data
-        assert len(data["results"]) == 3
-        q001_results = [r for r in data["results"] if r["questionId"] == "Q001"]
-        q002_results = [r for r in data["results"] if r["questionId"] == "Q002"]
-        assert len(q001_results) == 2
-        assert len(q002_results) == 1
-        assert (
-            q001_results[0]["isCorrect"] is True
-            and q001_results[0]["userAnswer"] == "A"
-        )
-        assert (
-            q001_results[1]["isCorrect"] is False
-            and q001_results[1]["userAnswer"] == "B"
-        )
-        assert (
-            q002_results[0]["isCorrect"] is True
-            and q002_results[0]["userAnswer"] == "B"
-        )
+    session_id = "test-session-duplicate-qid"
+    session_data = create_session_data({"Q001": "A", "Q002": "B"})
+    mocks.get_session.return_value = session_data
+
+    response = await _post_answers(async_client, _ANSWER_BODIES[session_id])
+
+    assert response.status_code == 200
+    data = response.json()
+    # validate_answer_results は重複IDに対応していないため、手動で検証
+    assert "results" in data
+    assert len(data["results"]) == 3
+    q001_results = [r for r in data["results"] if r["questionId"] == "Q001"]
+    q002_results = [r for r in data["results"] if r["questionId"] == "Q002"]
+    assert len(q001_results) == 2
+    assert len(q002_results) == 1
+    assert (
+        q001_results[0]["isCorrect"] is True
+        and q001_results[0]["userAnswer"] == "A"
+    )
+    assert (
+        q001_results[1]["isCorrect"] is False
+        and q001_results[1]["userAnswer"] == "B"
+    )
+    assert (
+        q002_results[0]["isCorrect"] is True
+        and q002_results[0]["userAnswer"] == "B"
+    )
 
-        mock_get_session.assert_called_once_with(session_id)
+    _assert_session_fetched(mocks, session_id)
 
 
-@pytest.mark.asyncio
-async def test_post_answers_invalid_answer_id(client, create_session_data):
+async def test_post_answers_invalid_answer_id(async_client, mocks, create_session_data):
     """POST /answers: 存在しない選択肢IDが指定された場合 (不正解扱い)"""
-    with patch(MOCK_GET_SESSION) as mock_get_session:
-        session_id = "test-session-invalid-answer"
-        session_data = create_session_data({"Q001": "A"})
-        mock_get_session.return_value = session_data
-
-        request_body = {
-            "sessionId": session_id,
-            "answers": [
-                {
-                    "questionId": "Q001",
-                    "answer": "C",
-                    "displayOrder": ["A", "B"],
-                },  # 不正解
-            ],
-        }
-        response = client.post("/answers", json=request_body)
+    session_id = "test-session-invalid-answer"
+    session_data = create_session_data({"Q001": "A"})
+    mocks.get_session.return_value = session_data
+
+    response = await _post_answers(async_client, _ANSWER_BODIES[session_id])
+
+    assert response.status_code == 200
+    data = response.json()
+    validate_answer_results(
+        data,
+        [
+            {
+                "questionId": "Q001",
+                "isCorrect": False,
+                "userAnswer": "C",
+                "correctAnswer": "A",
+            },
+        ],
+    )
+    _assert_session_fetched(mocks, session_id)
 
-        assert response.status_code == 200
-        data = response.json()
-        validate_answer_results(
-            data,
-            [
-                {
-                    "questionId": "Q001",
-                    "isCorrect": False,
-                    "userAnswer": "C",
-                    "correctAnswer": "A",
-                },
-            ],
-        )
-        mock_get_session.assert_called_once_with(session_id)
 
+async def test_post_answers_missing_answer(async_client, mocks, create_session_data):
+    """POST /answers: answer を省略した場合 (未解答として不正解扱い)"""
+    session_id = "test-session-missing-answer"
+    session_data = create_session_data({"Q001": "A"})
+    mocks.get_session.return_value = session_data
 
-@pytest.mark.asyncio
-async def test_post_answers_unknown_question_id(client, create_session_data):
+    response = await _post_answers(async_client, _ANSWER_BODIES[session_id])
+
+    assert response.status_code == 200
+    data = response.json()
+    validate_answer_results(
+        data,
+        [
+            {
+                "questionId": "Q001",
+                "isCorrect": False,
+                "userAnswer": None,
+                "correctAnswer": "A",
+            },
+        ],
+    )
+    _assert_session_fetched(mocks, session_id)
+
+
+async def test_post_answers_unknown_question_id(
+    async_client, mocks, create_session_data
+):
     """
     POST /answers: セッションに存在しない questionId を含む解答 (存在するIDのみ結果に)
     【追加されたテストケース】
     """
-    with patch(MOCK_GET_SESSION) as mock_get_session:
-        session_id = "test-session-unknown-qid"
-        session_data = create_session_data({"Q001": "A"})  # Q001 のみ存在
-        mock_get_session.return_value = session_data
-
-        request_body = {
-            "sessionId": session_id,
-            "answers": [
-                {
-                    "questionId": "Q001",
-                    "answer": "A",
-                    "displayOrder": ["A", "B"],
-                },  # 存在する
-                {
-                    "questionId": "Q999",
-                    "answer": "B",
-                    "displayOrder": ["A", "B"],
-                },  # 存在しない
-            ],
-        }
-        response = client.post("/answers", json=request_body)
-
-        assert response.status_code == 200
-        data = response.json()
-        # 存在する Q001 の結果のみ含まれる
-        validate_answer_results(
-            data,
-            [
-                {
-                    "questionId": "Q001",
-                    "isCorrect": True,
-                    "userAnswer": "A",
-                    "correctAnswer": "A",
-                },
-            ],
-        )
-        mock_get_session.assert_called_once_with(session_id)
+    session_id = "test-session-unknown-qid"
+    session_data = create_session_data({"Q001": "A"})  # Q001 のみ存在
+    mocks.get_session.return_value = session_data
+
+    response = await _post_answers(async_client, _ANSWER_BODIES[session_id])
+
+    assert response.status_code == 200
+    data = response.json()
+    # 存在する Q001 の結果のみ含まれる
+    validate_answer_results(
+        data,
+        [
+            {
+                "questionId": "Q001",
+                "isCorrect": True,
+                "userAnswer": "A",
+                "correctAnswer": "A",
+            },
+        ],
+    )
+    _assert_session_fetched(mocks, session_id)
 
 
-@pytest.mark.asyncio
 async def test_post_answers_session_data_with_empty_problem_data(
-    client, create_session_data
+    async_client, mocks, create_session_data
 ):
     """POST /answers: problem_data が空のセッションの場合 (空 results)"""
-    with patch(MOCK_GET_SESSION) as mock_get_session:
-        session_id = "test-session-empty-problem-data"
-        empty_session_data = SessionData(problem_data={}, ttl=9999999999)
-        mock_get_session.return_value = empty_session_data
-
-        request_body = {
-            "sessionId": session_id,
-            "answers": [
-                {"questionId": "Q001", "answer": "A", "displayOrder": ["A", "B"]}
-            ],
-        }
-        response = client.post("/answers", json=request_body)
+    session_id = "test-session-empty-problem-data"
+    empty_session_data = SessionData(problem_data={}, ttl=9999999999)
+    mocks.get_session.return_value = empty_session_data
 
-        assert response.status_code == 200
-        data = response.json()
-        assert "results" in data
-        assert data["results"] == []
-        mock_get_session.assert_called_once_with(session_id)
+    response = await _post_answers(async_client, _ANSWER_BODIES[session_id])
 
+    assert response.status_code == 200
+    data = response.json()
+    assert "results" in data
+    assert data["results"] == []
+    _assert_session_fetched(mocks, session_id)
 
-@pytest.mark.asyncio
-async def test_post_answers_validate_answers_error(client, create_session_data):
+
+async def test_post_answers_validate_answers_error(
+    async_client, mocks, create_session_data
+):
     """POST /answers: validate_answers 内部エラー (500)"""
-    with (
-        patch(MOCK_GET_SESSION) as mock_get_session,
-        patch(MOCK_VALIDATE_ANSWERS) as mock_validate,
-    ):  # validate_answers (同期) をモック
-        session_id = "test-session-validate-error"
-        session_data = create_session_data({"Q001": "A"})
-        mock_get_session.return_value = session_data
-        mock_validate.side_effect = Exception("Unexpected validation error")
-
-        request_body = {
-            "sessionId": session_id,
-            "answers": [
-                {"questionId": "Q001", "answer": "A", "displayOrder": ["A", "B"]}
-            ],
-        }
-        response = client.post("/answers", json=request_body)
+    session_id = "test-session-validate-error"
+    session_data = create_session_data({"Q001": "A"})
+    mocks.get_session.return_value = session_data
+    mocks.validate.side_effect = Exception("Unexpected validation error")
 
-        assert response.status_code == 500
-        assert (
-            response.json()["detail"]
-            == "An unexpected error occurred while processing your answers."
-        )
-        mock_get_session.assert_called_once_with(session_id)
-        mock_validate.assert_called_once()
-        # 呼び出し引数の検証 (より詳細に)
-        call_args, call_kwargs = mock_validate.call_args
-        assert len(call_args) == 2
-        assert isinstance(call_args[0], list)
-        assert len(call_args[0]) == 1
-        # Pydantic モデルとして比較
-        expected_answer = Answer(questionId="Q001", answer="A", displayOrder=["A", "B"])
-        assert call_args[0][0] == expected_answer
-        assert call_args[1] == session_data
+    response = await _post_answers(async_client, _ANSWER_BODIES[session_id])
+
+    assert response.status_code == 500
+    assert (
+        response.json()["detail"]
+        == "An unexpected error occurred while processing your answers."
+    )
+    _assert_session_fetched(mocks, session_id)
+    mocks.validate.assert_called_once()
+    # 呼び出し引数の検証 (より詳細に)
+    call_args, call_kwargs = mocks.validate.call_args
+    assert len(call_args) == 2
+    assert isinstance(call_args[0], list)
+    assert len(call_args[0]) == 1
+    # リクエストの全フィールドが渡っていることを、model_dump の辞書で比較する
+    received_answer = call_args[0][0]
+    assert received_answer.model_dump() == {
+        "questionId": "Q001",
+        "answer": "A",
+        "displayOrder": ["A", "B"],
+    }
+    assert call_args[1] == session_data
 
 
 # --- Test GET / ---
 
 
-@pytest.mark.asyncio
-async def test_root_endpoint(client):
+async def test_root_endpoint(async_client):
     """GET /: ルートエンドポイントのテスト"""
-    response = client.get("/")
+    response = await async_client.get("/")
     assert response.status_code == 200
-    assert response.json() == {"message": "Quiz App Backend is running!"}
+    assert response.json() == _ROOT_RESPONSE
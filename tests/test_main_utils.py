@@ -1,18 +1,33 @@
 # tests/test_main_utils.py
-from decimal import Decimal  # DynamoDB の数値型 Decimal 対策
+import asyncio
+import json
+import zlib
+from decimal import Decimal, Inexact
 from typing import List
-from unittest.mock import patch 
+from unittest.mock import AsyncMock, MagicMock
 
 import pytest
+from botocore.exceptions import ClientError, EndpointConnectionError
 
 # テスト対象の関数を main からインポート (パスは環境に合わせる)
 from app.main import (
+    PROBLEM_POOL_SIZE,
     SESSION_TTL_SECONDS,  # TTL 値
     ServiceError,  # 必要なら
+    _fetch_problems_from_dynamodb,
+    _problem_catalog_sizes,
+    _problem_pool_cache,
+    _problem_pool_cache_locks,
+    _ReservoirSampler,
+    _sample_problem_items_by_derived_ids,
+    _sample_problems_for_source,
+    build_session_and_response,
+    deserialize_dynamodb_item_fully,
+    get_questions_from_dynamodb,
     get_session_data,
-    shuffle_options,
     store_session_data,
 )
+from app.config import settings
 
 # 必要なモデルをインポート (パスは環境に合わせる)
 from app.models import (
@@ -31,163 +46,636 @@ from app.models import (
 def create_test_problem(
     q_id: str, book_src: str = "test_source", num_options: int = 3
 ) -> ProblemData:
-    """テスト用の ProblemData を生成するヘルパー"""
+    """テスト用の ProblemData を生成するヘルパー (固定のテストデータなので検証は省略する)"""
     options = [
-        Option(id=chr(65 + i), text=f"Option {chr(65 + i)}") for i in range(num_options)
+        Option.model_construct(id=chr(65 + i), text=f"Option {chr(65 + i)}")
+        for i in range(num_options)
     ]
-    return ProblemData(
+    return ProblemData.model_construct(
         questionId=q_id,
         bookSource=book_src,
         category=f"Cat {q_id}",
         question=f"Question text for {q_id}",
         options=options,
         correctAnswer="A",  # 仮に A を正解とする
-        explanation=Explanation(explanation=f"Explanation for {q_id}"),
+        explanation=Explanation.model_construct(explanation=f"Explanation for {q_id}"),
     )
 
 
-@pytest.fixture
+# 問題データはモジュール読み込み時に1度だけ作り、フィクスチャではそのリストを返す
+_TEST_PROBLEMS = (
+    create_test_problem("Q001", num_options=4),
+    create_test_problem("Q002", num_options=3),
+    create_test_problem("Q003", num_options=1),  # 選択肢が1つ
+    create_test_problem("Q004", num_options=0),  # 選択肢が0
+)
+
+
+@pytest.fixture(scope="module")
 def problem_list_fixture():
-    """複数の ProblemData を含むリストを返す Fixture"""
-    return [
-        create_test_problem("Q001", num_options=4),
-        create_test_problem("Q002", num_options=3),
-        create_test_problem("Q003", num_options=1),  # 選択肢が1つ
-        create_test_problem("Q004", num_options=0),  # 選択肢が0
-    ]
+    """
+    複数の ProblemData を含むリストを返す Fixture。
+    モジュール内で共有するため、テスト側でリストや問題を変更しないこと。
+    """
+    return list(_TEST_PROBLEMS)
 
 
-# --- Tests for shuffle_options ---
+# --- Tests for build_session_and_response ---
 
 
-def test_shuffle_options_basic(problem_list_fixture):
-    """shuffle_options: 基本的なシャッフル動作（要素数、ID構成の維持）を確認"""
-    problems = [
-        p.model_copy(deep=True) for p in problem_list_fixture[:2]
-    ]  # Q001, Q002 をコピーして使用
+def test_build_session_and_response_basic(problem_list_fixture):
+    """build_session_and_response: シャッフル後も選択肢の要素数・ID構成が維持され、両方の出力が揃う"""
+    # build_session_and_response は入力の選択肢を並べ替えないのでコピーは不要
+    problems = problem_list_fixture[:2]  # Q001, Q002
     original_options_q1 = problems[0].options[:]  # 元の順序をコピー
     original_options_q2 = problems[1].options[:]
 
-    # 関数を実行 (元のリストを変更する副作用がある)
-    shuffled_problems = shuffle_options(problems)
-
-    # 返り値が元のリストと同じオブジェクトであること (in-place shuffle)
-    assert shuffled_problems is problems
+    problem_data_map, questions = build_session_and_response(problems)
 
     # 問題数は変わらない
-    assert len(shuffled_problems) == 2
+    assert len(questions) == 2
+    assert set(problem_data_map) == {"Q001", "Q002"}
 
     # 各問題の選択肢の要素数が変わらないこと
-    assert len(shuffled_problems[0].options) == len(original_options_q1)
-    assert len(shuffled_problems[1].options) == len(original_options_q2)
+    assert len(questions[0].options) == len(original_options_q1)
+    assert len(questions[1].options) == len(original_options_q2)
 
     # 各問題の選択肢の ID 構成が変わらないこと (セットで比較)
-    assert {opt.id for opt in shuffled_problems[0].options} == {
+    assert {opt.id for opt in questions[0].options} == {
         opt.id for opt in original_options_q1
     }
-    assert {opt.id for opt in shuffled_problems[1].options} == {
+    assert {opt.id for opt in questions[1].options} == {
         opt.id for opt in original_options_q2
     }
 
-    # 選択肢の中身 (text) が維持されていることを確認 (代表例)
-    assert any(opt.text == "Option A" for opt in shuffled_problems[0].options)
-    assert any(opt.text == "Option B" for opt in shuffled_problems[1].options)
+    # 入力 (モジュール共有の fixture) の選択肢の順序は変わらないこと
+    assert problems[0].options == original_options_q1
+    assert problems[1].options == original_options_q2
+
+    # レスポンスとセッションの選択肢の並びが一致すること (ユーザーが見た順序で保存)
+    assert [opt.id for opt in problem_data_map["Q001"].options] == [
+        opt.id for opt in questions[0].options
+    ]
 
+    # セッション側には採点用の情報が入る
+    assert problem_data_map["Q001"].correctAnswer == "A"
+    assert problem_data_map["Q001"].explanation == "Explanation for Q001"
 
-def test_shuffle_options_single_option(problem_list_fixture):
-    """shuffle_options: 選択肢が1つの場合は順序は変わらない"""
-    problems = [problem_list_fixture[2].model_copy(deep=True)]  # Q003 (選択肢1つ)
-    original_options = problems[0].options[:]
+    # 選択肢の中身 (text) が維持されていることを確認 (代表例)
+    assert any(opt.text == "Option A" for opt in questions[0].options)
+    assert any(opt.text == "Option B" for opt in questions[1].options)
 
-    shuffled_problems = shuffle_options(problems)
 
-    assert shuffled_problems is problems
-    assert len(shuffled_problems[0].options) == 1
-    # 順序も変わらないはず
-    assert shuffled_problems[0].options[0].id == original_options[0].id
+@pytest.fixture(params=[0, 1, 3, 4], ids=lambda n: f"{n}_options")
+def parametrized_problem(request):
+    """選択肢の数だけを変えた ProblemData を返す Fixture"""
+    return create_test_problem("Qx", num_options=request.param)
 
 
-def test_shuffle_options_no_options(problem_list_fixture):
-    """shuffle_options: 選択肢が0個の場合でもエラーにならない"""
-    problems = [problem_list_fixture[3].model_copy(deep=True)]  # Q004 (選択肢0個)
+def test_build_session_and_response_preserves_option_ids(parametrized_problem):
+    """build_session_and_response: 選択肢の数によらず、ID 構成を保ったまま並べ替える (0個でもエラーにならない)"""
+    original_ids = [opt.id for opt in parametrized_problem.options]
 
-    shuffled_problems = shuffle_options(problems)
+    problem_data_map, questions = build_session_and_response([parametrized_problem])
 
-    assert shuffled_problems is problems
-    assert len(shuffled_problems[0].options) == 0
+    shuffled_ids = [opt.id for opt in questions[0].options]
+    assert sorted(shuffled_ids) == original_ids
+    # セッションにはユーザーが見た順序で保存される
+    assert [opt.id for opt in problem_data_map["Qx"].options] == shuffled_ids
 
 
-def test_shuffle_options_empty_list():
-    """shuffle_options: 問題リストが空の場合でもエラーにならない"""
+def test_build_session_and_response_empty_list():
+    """build_session_and_response: 問題リストが空の場合でもエラーにならない"""
     problems: List[ProblemData] = []
-    shuffled_problems = shuffle_options(problems)
-    assert shuffled_problems == []
+    problem_data_map, questions = build_session_and_response(problems)
+    assert problem_data_map == {}
+    assert questions == []
+
+
+# --- Tests for get_questions_from_dynamodb (問題プールキャッシュ) ---
+
+MOCK_FETCH_PROBLEMS = "app.main._fetch_problems_from_dynamodb"
+
+
+@pytest.fixture
+def clear_problem_pool_cache():
+    """テスト間でプールキャッシュとロックが共有されないようにクリアする"""
+    _problem_pool_cache.clear()
+    _problem_pool_cache_locks.clear()
+    yield
+    _problem_pool_cache.clear()
+    _problem_pool_cache_locks.clear()
+
+
+@pytest.fixture
+def mock_fetch(monkeypatch):
+    """_fetch_problems_from_dynamodb をテストごとに新しい AsyncMock へ差し替える"""
+    mock = AsyncMock()
+    monkeypatch.setattr(MOCK_FETCH_PROBLEMS, mock)
+    return mock
+
+
+async def test_get_questions_from_dynamodb_uses_cached_pool(
+    clear_problem_pool_cache, mock_fetch, problem_list_fixture
+):
+    """get_questions_from_dynamodb: 2回目以降はキャッシュしたプールからサンプリングする"""
+    pool = problem_list_fixture[:3]
+    mock_fetch.return_value = pool
+
+    first = await get_questions_from_dynamodb(AsyncMock(), "readable_code", 2)
+    second = await get_questions_from_dynamodb(AsyncMock(), "readable_code", 2)
+
+    # DynamoDB からの取得は1回だけで、プールサイズは count より多めに要求される
+    mock_fetch.assert_awaited_once()
+    assert mock_fetch.call_args[0][1:] == ("readable_code", PROBLEM_POOL_SIZE)
+    assert len(first) == 2
+    assert len(second) == 2
+    assert {p.questionId for p in first + second} <= {p.questionId for p in pool}
+
+
+async def test_get_questions_from_dynamodb_cache_keyed_by_source(
+    clear_problem_pool_cache, mock_fetch, problem_list_fixture
+):
+    """get_questions_from_dynamodb: 同じ bookSource なら count が違ってもプールを共有する"""
+    mock_fetch.return_value = problem_list_fixture
+
+    await get_questions_from_dynamodb(AsyncMock(), "readable_code", 1)
+    await get_questions_from_dynamodb(AsyncMock(), "readable_code", 2)
+    await get_questions_from_dynamodb(AsyncMock(), "both", 2)
+
+    assert mock_fetch.await_count == 2
+
+
+async def test_get_questions_from_dynamodb_concurrent_misses_fetch_once(
+    clear_problem_pool_cache, mock_fetch, problem_list_fixture
+):
+    """get_questions_from_dynamodb: 同じ bookSource の同時ミスでも DynamoDB からの取得は1回"""
+    release = asyncio.Event()
+
+    async def slow_fetch(dynamodb_client, book_source, count):
+        await release.wait()
+        return problem_list_fixture
+
+    mock_fetch.side_effect = slow_fetch
+    tasks = [
+        asyncio.create_task(
+            get_questions_from_dynamodb(AsyncMock(), "readable_code", 2)
+        )
+        for _ in range(3)
+    ]
+    await asyncio.sleep(0)
+    release.set()
+    results = await asyncio.gather(*tasks)
+
+    mock_fetch.assert_awaited_once()
+    assert all(len(result) == 2 for result in results)
+
+
+async def test_get_questions_from_dynamodb_refill_does_not_block_other_sources(
+    clear_problem_pool_cache, mock_fetch, problem_list_fixture
+):
+    """get_questions_from_dynamodb: 取得し直している bookSource があっても、他のキャッシュヒットは待たない"""
+    _problem_pool_cache["both"] = (float("inf"), problem_list_fixture)
+    release = asyncio.Event()
+
+    async def slow_fetch(dynamodb_client, book_source, count):
+        await release.wait()
+        return problem_list_fixture
+
+    mock_fetch.side_effect = slow_fetch
+    refill = asyncio.create_task(
+        get_questions_from_dynamodb(AsyncMock(), "readable_code", 2)
+    )
+    await asyncio.sleep(0)
+
+    hit = await asyncio.wait_for(
+        get_questions_from_dynamodb(AsyncMock(), "both", 2), timeout=1
+    )
+
+    assert len(hit) == 2
+    assert not refill.done()
+    release.set()
+    assert len(await refill) == 2
+
+
+async def test_get_questions_from_dynamodb_invalidates_pool_on_error(
+    clear_problem_pool_cache, mock_fetch, problem_list_fixture
+):
+    """get_questions_from_dynamodb: 再取得に失敗したら期限切れのプールを破棄してエラーを返す"""
+    _problem_pool_cache["readable_code"] = (0.0, problem_list_fixture)
+    mock_fetch.side_effect = ServiceError(status_code=500, detail="db down")
+
+    with pytest.raises(ServiceError):
+        await get_questions_from_dynamodb(AsyncMock(), "readable_code", 2)
+
+    assert "readable_code" not in _problem_pool_cache
+
+
+async def test_get_questions_from_dynamodb_zero_count(
+    clear_problem_pool_cache, mock_fetch
+):
+    """get_questions_from_dynamodb: count が0以下なら DynamoDB にアクセスせず空リスト"""
+    assert await get_questions_from_dynamodb(AsyncMock(), "readable_code", 0) == []
+
+    mock_fetch.assert_not_awaited()
+
+
+# --- Tests for deserialize_dynamodb_item_fully ---
+
+
+def test_deserialize_dynamodb_item_fully_fast_path_and_nested():
+    """deserialize_dynamodb_item_fully: S/N の高速パスと、それ以外の型の変換結果"""
+    item = {
+        "questionId": {"S": "Q001"},
+        "ttl": {"N": "1700000000"},
+        "options": {"L": [{"M": {"id": {"S": "A"}, "text": {"S": "Opt A"}}}]},
+        "flag": {"BOOL": True},
+    }
+
+    result = deserialize_dynamodb_item_fully(item)
+
+    assert result == {
+        "questionId": "Q001",
+        "ttl": Decimal("1700000000"),
+        "options": [{"id": "A", "text": "Opt A"}],
+        "flag": True,
+    }
+    assert isinstance(result["ttl"], Decimal)
+
+
+def test_deserialize_dynamodb_item_fully_rejects_inexact_number():
+    """deserialize_dynamodb_item_fully: N の高速パスも TypeDeserializer と同じく精度超過を丸めない"""
+    too_precise = "1." + "1" * 40  # DynamoDB の最大精度 (38桁) を超える
+
+    with pytest.raises(Inexact):
+        deserialize_dynamodb_item_fully({"value": {"N": too_precise}})
+
+
+# --- Tests for _sample_problems_for_source / _fetch_problems_from_dynamodb ---
+
+
+def _make_problem_item(q_id: str, book_src: str = "readable_code") -> dict:
+    """BatchGetItem が返す低レベル形式の問題アイテムを作る"""
+    return {
+        "questionId": {"S": q_id},
+        "bookSource": {"S": book_src},
+        "category": {"S": "test_cat"},
+        "question": {"S": f"Question {q_id}"},
+        "options": {
+            "L": [
+                {"M": {"id": {"S": "A"}, "text": {"S": "A"}}},
+                {"M": {"id": {"S": "B"}, "text": {"S": "B"}}},
+            ]
+        },
+        "correctAnswer": {"S": "A"},
+        "explanation": {"M": {"explanation": {"S": f"Expl {q_id}"}}},
+    }
+
+
+def _make_key_item(q_id: str) -> dict:
+    """questionId だけを射影した GSI の Query が返すアイテムを作る"""
+    return {"questionId": {"S": q_id}}
+
+
+def _is_max_id_query(query_kwargs: dict) -> bool:
+    """最大の連番を読む Query (questionId の降順で1件) かどうか"""
+    return query_kwargs.get("ScanIndexForward") is False
+
+
+def _fake_batch_get(make_item=_make_problem_item, missing_ids=frozenset()):
+    """要求されたキーの問題アイテムを返す batch_get_item の side_effect を作る"""
+
+    async def batch_get_side_effect(RequestItems):
+        keys = RequestItems[settings.dynamodb_quiz_problems_table_name]["Keys"]
+        items = [
+            make_item(key["questionId"]["S"])
+            for key in keys
+            if key["questionId"]["S"] not in missing_ids
+        ]
+        return {"Responses": {settings.dynamodb_quiz_problems_table_name: items}}
+
+    return batch_get_side_effect
+
+
+@pytest.fixture
+def clear_problem_catalog_sizes():
+    """テスト間で記録済みの問題数が共有されないようにクリアする"""
+    _problem_catalog_sizes.clear()
+    yield
+    _problem_catalog_sizes.clear()
+
+
+def test_reservoir_sampler_keeps_at_most_size_items():
+    """_ReservoirSampler: size を超えて投入しても保持するのは size 件"""
+    reservoir = _ReservoirSampler(3)
+    for i in range(10):
+        reservoir.add(f"RC{i:03d}")
+
+    assert reservoir.seen == 10
+    assert len(reservoir.items) == 3
+    assert len(set(reservoir.items)) == 3
+
+
+async def test_sample_problems_for_source_reads_all_pages(clear_problem_catalog_sizes):
+    """_sample_problems_for_source: LastEvaluatedKey を辿って全ページをリザーバに投入する"""
+    client = AsyncMock()
+    client.query.side_effect = [
+        {
+            "Items": [_make_key_item("RC001"), _make_key_item("RC002")],
+            "LastEvaluatedKey": {"questionId": {"S": "RC002"}},
+        },
+        {"Items": [_make_key_item("RC003")]},
+    ]
+    reservoir = _ReservoirSampler(2)
+
+    await _sample_problems_for_source(client, "readable_code", reservoir)
+
+    assert client.query.await_count == 2
+    assert reservoir.seen == 3
+    assert set(reservoir.items) <= {"RC001", "RC002", "RC003"}
+    first_kwargs = client.query.call_args_list[0].kwargs
+    # GSI の射影設定に依存しないようキーだけを取得し、全ページを読むため Limit は付けない
+    assert first_kwargs["ProjectionExpression"] == "questionId"
+    assert "Limit" not in first_kwargs
+    assert "ExclusiveStartKey" not in first_kwargs
+    assert client.query.call_args_list[1].kwargs["ExclusiveStartKey"] == {
+        "questionId": {"S": "RC002"}
+    }
+    assert _problem_catalog_sizes == {"readable_code": 3}
+
+
+async def test_fetch_problems_from_dynamodb_falls_back_to_reservoir(
+    clear_problem_catalog_sizes,
+):
+    """_fetch_problems_from_dynamodb: 問題数が未計測なら連番IDを使わず、リザーバで選んだIDを BatchGetItem で取得する"""
+    client = AsyncMock()
+    client.query.return_value = {
+        "Items": [_make_key_item(f"RC{i:03d}") for i in range(1, 6)]
+    }
+    client.batch_get_item.side_effect = _fake_batch_get()
+
+    problems = await _fetch_problems_from_dynamodb(client, "readable_code", 3)
+
+    assert len(problems) == 3
+    assert all(isinstance(p, ProblemData) for p in problems)
+    client.query.assert_awaited_once()
+    assert not _is_max_id_query(client.query.call_args.kwargs)
+    client.batch_get_item.assert_awaited_once()
+    # 読んだ問題数を記録し、次回の取得方法の判断に使う
+    assert _problem_catalog_sizes == {"readable_code": 5}
+
+
+async def test_fetch_problems_from_dynamodb_small_catalog_skips_derived_ids(
+    clear_problem_catalog_sizes,
+):
+    """_fetch_problems_from_dynamodb: 問題数が count 以下と分かっていれば最大の連番を読まない"""
+    _problem_catalog_sizes["readable_code"] = 3
+    client = AsyncMock()
+    client.query.return_value = {
+        "Items": [_make_key_item(f"RC{i:03d}") for i in range(1, 4)]
+    }
+    client.batch_get_item.side_effect = _fake_batch_get()
+
+    problems = await _fetch_problems_from_dynamodb(client, "readable_code", 3)
+
+    assert len(problems) == 3
+    client.query.assert_awaited_once()
+    assert not _is_max_id_query(client.query.call_args.kwargs)
+
+
+async def test_fetch_problems_from_dynamodb_skips_invalid_items(
+    clear_problem_catalog_sizes,
+):
+    """_fetch_problems_from_dynamodb: 一括検証に失敗したら1件ずつ検証し、不正なアイテムだけ除外する"""
+
+    def make_item(q_id: str) -> dict:
+        item = _make_problem_item(q_id)
+        if q_id == "RC002":
+            del item["correctAnswer"]
+        return item
+
+    client = AsyncMock()
+    client.query.return_value = {
+        "Items": [_make_key_item(f"RC{i:03d}") for i in range(1, 4)]
+    }
+    client.batch_get_item.side_effect = _fake_batch_get(make_item)
+
+    problems = await _fetch_problems_from_dynamodb(client, "readable_code", 3)
+
+    assert sorted(p.questionId for p in problems) == ["RC001", "RC003"]
+
+
+async def test_fetch_problems_from_dynamodb_ignores_extra_option_attributes(
+    clear_problem_catalog_sizes,
+):
+    """_fetch_problems_from_dynamodb: 選択肢に未知の属性があっても問題は除外されない"""
+
+    def make_item(q_id: str) -> dict:
+        item = _make_problem_item(q_id)
+        item["options"]["L"][0]["M"]["hint"] = {"S": "extra"}
+        return item
+
+    client = AsyncMock()
+    client.query.return_value = {"Items": [_make_key_item("RC001")]}
+    client.batch_get_item.side_effect = _fake_batch_get(make_item)
+
+    problems = await _fetch_problems_from_dynamodb(client, "readable_code", 1)
+
+    assert [p.questionId for p in problems] == ["RC001"]
+    assert problems[0].options[0] == Option(id="A", text="A")
+
+
+async def test_fetch_problems_from_dynamodb_not_found(clear_problem_catalog_sizes):
+    """_fetch_problems_from_dynamodb: 問題が1件もなければ 404"""
+    client = AsyncMock()
+    client.query.return_value = {"Items": []}
+
+    with pytest.raises(ServiceError) as excinfo:
+        await _fetch_problems_from_dynamodb(client, "both", 3)
+
+    assert excinfo.value.status_code == 404
+    # both は2ソースで、それぞれリザーバ用の Query を1回ずつ (問題数が未計測なので連番IDは使わない)
+    assert client.query.await_count == 2
+    assert not any(
+        _is_max_id_query(call.kwargs) for call in client.query.call_args_list
+    )
+    client.batch_get_item.assert_not_called()
+
+
+async def test_fetch_problems_from_dynamodb_by_derived_ids(clear_problem_catalog_sizes):
+    """_fetch_problems_from_dynamodb: 問題数が十分あれば、連番IDを抽出して BatchGetItem で直接取得する"""
+    _problem_catalog_sizes["readable_code"] = 10
+    client = AsyncMock()
+    client.query.return_value = {"Items": [_make_key_item("RC010")]}
+    # RC004 は欠番とする
+    client.batch_get_item.side_effect = _fake_batch_get(missing_ids={"RC004"})
+
+    problems = await _fetch_problems_from_dynamodb(client, "readable_code", 3)
+
+    assert len(problems) == 3
+    assert len({p.questionId for p in problems}) == 3
+    assert all(p.questionId in {f"RC{i:03d}" for i in range(1, 11)} for p in problems)
+    # GSI からは最大の連番を1件だけ読み、全件の Query はしない
+    client.query.assert_awaited_once()
+    query_kwargs = client.query.call_args.kwargs
+    assert _is_max_id_query(query_kwargs)
+    assert query_kwargs["Limit"] == 1
+
+
+async def test_sample_problem_items_by_derived_ids_covers_ids_above_gaps():
+    """_sample_problem_items_by_derived_ids: 欠番があっても、問題数より大きい番号のIDまで候補に入る"""
+    # RC001-RC040 のうち RC007 が欠番 (問題数は39だが最大の連番は40)
+    client = AsyncMock()
+    client.query.return_value = {"Items": [_make_key_item("RC040")]}
+    client.batch_get_item.side_effect = _fake_batch_get(missing_ids={"RC007"})
+
+    raw_items = await _sample_problem_items_by_derived_ids(
+        client, ["readable_code"], 39
+    )
+
+    # 欠番の分は残りの候補で補うので、存在する39件がすべて選ばれる
+    assert {item["questionId"]["S"] for item in raw_items} == {
+        f"RC{i:03d}" for i in range(1, 41) if i != 7
+    }
+    client.query.assert_awaited_once()
+
+
+async def test_fetch_problems_from_dynamodb_max_id_connection_error_falls_back(
+    clear_problem_catalog_sizes,
+):
+    """_fetch_problems_from_dynamodb: 最大の連番の取得が接続エラー (BotoCoreError) ならリザーバに切り替える"""
+    _problem_catalog_sizes["readable_code"] = 10
+
+    async def query_side_effect(**kwargs):
+        if _is_max_id_query(kwargs):
+            raise EndpointConnectionError(endpoint_url="http://localhost:4566")
+        return {"Items": [_make_key_item(f"RC{i:03d}") for i in range(1, 6)]}
+
+    client = AsyncMock()
+    client.query.side_effect = query_side_effect
+    client.batch_get_item.side_effect = _fake_batch_get()
+
+    problems = await _fetch_problems_from_dynamodb(client, "readable_code", 3)
+
+    assert len(problems) == 3
+    max_id_queries = [
+        _is_max_id_query(call.kwargs) for call in client.query.call_args_list
+    ]
+    assert max_id_queries == [True, False]
+
+
+async def test_fetch_problems_from_dynamodb_cancels_pending_query_on_error(
+    clear_problem_catalog_sizes,
+):
+    """_fetch_problems_from_dynamodb: 片方のソースが失敗したら、もう片方のクエリを待たずにキャンセルする"""
+    # 最大の連番の取得は成功させ、連番IDが見つからずに切り替わったリザーバ用の Query の失敗を確かめる
+    _problem_catalog_sizes.update(readable_code=10, programming_principles=10)
+    slow_query_cancelled = asyncio.Event()
+
+    async def query_side_effect(**kwargs):
+        book_src = kwargs["ExpressionAttributeValues"][":bs"]["S"]
+        if _is_max_id_query(kwargs):
+            prefix = settings.question_id_prefixes[book_src]
+            return {"Items": [_make_key_item(f"{prefix}010")]}
+        if book_src == "readable_code":
+            raise ClientError(
+                {"Error": {"Code": "InternalServerError", "Message": "boom"}}, "Query"
+            )
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            slow_query_cancelled.set()
+            raise
+        return {"Items": []}
+
+    client = AsyncMock()
+    client.query.side_effect = query_side_effect
+    client.batch_get_item.return_value = {"Responses": {}}  # 連番のIDが1件もない
+
+    with pytest.raises(ServiceError) as excinfo:
+        await _fetch_problems_from_dynamodb(client, "both", 3)
+
+    assert excinfo.value.status_code == 500
+    assert excinfo.value.detail == "Database query failed for source 'readable_code'."
+    await asyncio.wait_for(slow_query_cancelled.wait(), timeout=1)
 
 
 # --- Tests for store_session_data ---
 
-# DynamoDB テーブルのモック用パス (環境に合わせて修正)
-MOCK_DYNAMODB_TABLE = "app.main.dynamodb_table"
-MOCK_TIME_MODULE = "app.main.time"  # time モジュール全体
+# 現在時刻を返す関数のモック用パス
+MOCK_NOW = "app.main._now"
+
+
+@pytest.fixture
+def mock_now(monkeypatch):
+    """app.main._now をモックに差し替える (テスト終了時に monkeypatch が戻す)"""
+    mock = MagicMock()
+    monkeypatch.setattr(MOCK_NOW, mock)
+    return mock
+
+
+@pytest.fixture
+def mock_dynamodb_client():
+    """低レベル DynamoDB クライアントのモック (put_item / get_item は await される)"""
+    client = AsyncMock()
+    client.put_item.return_value = {}
+    client.get_item.return_value = {}
+    return client
 
 
-@patch(MOCK_DYNAMODB_TABLE)  # dynamodb_table をモック
-@patch(MOCK_TIME_MODULE)  # time モジュールをモック
-def test_store_session_data_success(mock_time, mock_db_table, problem_list_fixture):
+async def test_store_session_data_success(
+    mock_now, mock_dynamodb_client, problem_list_fixture
+):
     """store_session_data: 正常にデータが保存されること"""
-    mock_time.time.return_value = 1700000000  # 固定の現在時刻
+    mock_now.return_value = 1700000000  # 固定の現在時刻
     session_id = "test-session-store-1"
-    problems = problem_list_fixture[:2]  # Q001, Q002
+    problem_data_map, _ = build_session_and_response(
+        problem_list_fixture[:2]
+    )  # Q001, Q002
 
-    store_session_data(session_id, problems)
+    await store_session_data(mock_dynamodb_client, session_id, problem_data_map)
 
-    # time.time が呼ばれたか確認
-    mock_time.time.assert_called_once()
+    # _now が呼ばれたか確認
+    mock_now.assert_called_once()
 
-    # dynamodb_table.put_item が呼ばれたか確認
-    mock_db_table.put_item.assert_called_once()
+    # put_item が呼ばれたか確認
+    mock_dynamodb_client.put_item.assert_awaited_once()
 
-    # put_item に渡された引数 (Item) を確認
-    call_args, call_kwargs = mock_db_table.put_item.call_args
-    assert "Item" in call_kwargs
+    # put_item に渡された引数 (TableName, Item) を確認
+    call_args, call_kwargs = mock_dynamodb_client.put_item.call_args
+    assert call_kwargs["TableName"] == settings.dynamodb_session_table_name
     item = call_kwargs["Item"]
 
-    # sessionId が正しいか
-    assert item["sessionId"] == session_id
+    # sessionId が正しいか (低レベルAPIなので AttributeValue 形式)
+    assert item["sessionId"] == {"S": session_id}
 
     # TTL が正しく計算されているか (固定時刻 + SESSION_TTL_SECONDS)
     expected_ttl = 1700000000 + SESSION_TTL_SECONDS
-    assert item["ttl"] == expected_ttl
+    assert item["ttl"] == {"N": str(expected_ttl)}
 
-    # problem_data が正しく変換されているか
-    assert "problem_data" in item
-    assert isinstance(item["problem_data"], dict)
-    assert len(item["problem_data"]) == 2  # 問題数
+    # セッション全体が圧縮済み JSON のバイナリ属性として保存されているか
+    stored_session = json.loads(zlib.decompress(item["data"]["B"]))
+    assert stored_session["ttl"] == expected_ttl
+    problem_data = stored_session["problem_data"]
+    assert len(problem_data) == 2  # 問題数
 
     # Q001 のデータを確認 (部分的に)
-    assert "Q001" in item["problem_data"]
-    q1_data = item["problem_data"]["Q001"]
+    q1_data = problem_data["Q001"]
     assert q1_data["questionId"] == "Q001"
     assert q1_data["correctAnswer"] == "A"  # create_test_problem のデフォルト
     assert q1_data["question"] == "Question text for Q001"
     assert q1_data["explanation"] == "Explanation for Q001"
-    assert isinstance(q1_data["options"], list)
     assert len(q1_data["options"]) == 4  # Q001 は選択肢4つで作成
-    assert q1_data["options"][0] == {
-        "id": "A",
-        "text": "Option A",
-    }  # Pydantic -> dict 変換後
+    assert {"id": "A", "text": "Option A"} in q1_data["options"]  # シャッフル済み
 
 
-@patch(MOCK_DYNAMODB_TABLE)
-@patch(MOCK_TIME_MODULE)
-def test_store_session_data_db_error(mock_time, mock_db_table, problem_list_fixture):
+async def test_store_session_data_db_error(
+    mock_now, mock_dynamodb_client, problem_list_fixture
+):
     """store_session_data: DynamoDB でエラーが発生した場合に ServiceError"""
-    mock_time.time.return_value = 1700000000
+    mock_now.return_value = 1700000000
     # put_item が ClientError を送出するように設定
-    from botocore.exceptions import ClientError
-
-    mock_db_table.put_item.side_effect = ClientError(
+    mock_dynamodb_client.put_item.side_effect = ClientError(
         error_response={
             "Error": {
                 "Code": "ProvisionedThroughputExceededException",
@@ -198,52 +686,76 @@ def test_store_session_data_db_error(mock_time, mock_db_table, problem_list_fixt
     )
 
     session_id = "test-session-store-error"
-    problems = problem_list_fixture[:1]
+    problem_data_map, _ = build_session_and_response(problem_list_fixture[:1])
 
     with pytest.raises(ServiceError) as excinfo:
-        store_session_data(session_id, problems)
+        await store_session_data(mock_dynamodb_client, session_id, problem_data_map)
 
     assert excinfo.value.status_code == 500
     assert "Failed to store session data" in excinfo.value.detail
-    mock_db_table.put_item.assert_called_once()  # エラーでも呼び出しはされる
+    mock_dynamodb_client.put_item.assert_awaited_once()  # エラーでも呼び出しはされる
 
 
 # --- Tests for get_session_data ---
 
 
-@patch(MOCK_DYNAMODB_TABLE)
-@patch(MOCK_TIME_MODULE)
-def test_get_session_data_success(mock_time, mock_db_table):
+def _make_session_item(session_id: str, ttl: int, problem_data: dict) -> dict:
+    """get_item が返す低レベル形式のセッションアイテム (SessionData 全体を圧縮JSON) を作る"""
+    session_blob = json.dumps({"problem_data": problem_data, "ttl": ttl})
+    return {
+        "sessionId": {"S": session_id},
+        "ttl": {"N": str(ttl)},
+        "data": {"B": zlib.compress(session_blob.encode("utf-8"))},
+    }
+
+
+# get_session_data テストで共通に使う現在時刻と problem_data (テストごとに TTL だけ変える)
+_SESSION_CURRENT_TIME = 1700000000
+_VALID_SESSION_PROBLEM_DATA = {
+    "Q101": {
+        "questionId": "Q101",
+        "correctAnswer": "C",
+        "category": "Get Test",
+        "question": "Get Q1",
+        "options": [{"id": "A", "text": "A"}, {"id": "C", "text": "C"}],
+        "explanation": "Get E1",
+    }
+}
+# problem_data の形式が不正 (例: correctAnswer がない)
+_INVALID_SESSION_PROBLEM_DATA = {
+    "Q1": {
+        "questionId": "Q1",
+        # "correctAnswer": "A", # 必須フィールドが欠けている
+        "options": [],
+    }
+}
+
+
+def _expected_get_item_kwargs(session_id: str):
+    return {
+        "TableName": settings.dynamodb_session_table_name,
+        "Key": {"sessionId": {"S": session_id}},
+    }
+
+
+async def test_get_session_data_success(mock_now, mock_dynamodb_client):
     """get_session_data: 正常にデータが取得・パースされること"""
     session_id = "test-session-get-1"
-    current_time = 1700000000
-    ttl_valid = current_time + 1000  # 有効なTTL
-    mock_time.time.return_value = current_time
-
-    # get_item が返すダミーの DynamoDB アイテム
-    # DynamoDB は数値を Decimal で返すことがあるため、それを模倣
-    mock_item = {
-        "sessionId": session_id,
-        "ttl": Decimal(str(ttl_valid)),  # Decimal で返す
-        "problem_data": {
-            "Q101": {
-                "questionId": "Q101",
-                "correctAnswer": "C",
-                "category": "Get Test",
-                "question": "Get Q1",
-                "options": [{"id": "A", "text": "A"}, {"id": "C", "text": "C"}],
-                "explanation": "Get E1",
-            }
-        },
-    }
-    mock_db_table.get_item.return_value = {"Item": mock_item}
+    ttl_valid = _SESSION_CURRENT_TIME + 1000  # 有効なTTL
+    mock_now.return_value = _SESSION_CURRENT_TIME
+
+    # get_item が返すダミーの DynamoDB アイテム (低レベルAPIの AttributeValue 形式)
+    mock_item = _make_session_item(session_id, ttl_valid, _VALID_SESSION_PROBLEM_DATA)
+    mock_dynamodb_client.get_item.return_value = {"Item": mock_item}
 
-    session_data = get_session_data(session_id)
+    session_data = await get_session_data(mock_dynamodb_client, session_id)
 
-    # time.time が呼ばれたか (TTL チェックのため)
-    mock_time.time.assert_called_once()
+    # _now が呼ばれたか (TTL チェックのため)
+    mock_now.assert_called_once()
     # get_item が正しいキーで呼ばれたか
-    mock_db_table.get_item.assert_called_once_with(Key={"sessionId": session_id})
+    mock_dynamodb_client.get_item.assert_awaited_once_with(
+        **_expected_get_item_kwargs(session_id)
+    )
 
     # SessionData オブジェクトが返されること
     assert isinstance(session_data, SessionData)
@@ -262,88 +774,115 @@ def test_get_session_data_success(mock_time, mock_db_table):
     assert item_data.options[0].id == "A"
 
 
-@patch(MOCK_DYNAMODB_TABLE)
-@patch(MOCK_TIME_MODULE)
-def test_get_session_data_not_found(mock_time, mock_db_table):
+async def test_get_session_data_legacy_format(mock_now, mock_dynamodb_client):
+    """get_session_data: problem_data を Map 属性で持つ旧形式のセッションも読める"""
+    session_id = "test-session-get-legacy"
+    ttl_valid = _SESSION_CURRENT_TIME + 1000
+    mock_now.return_value = _SESSION_CURRENT_TIME
+
+    # 圧縮形式に切り替える前の store_session_data が書き込んでいた形式
+    legacy_item = {
+        "sessionId": {"S": session_id},
+        "ttl": {"N": str(ttl_valid)},
+        "problem_data": {
+            "M": {
+                "Q101": {
+                    "M": {
+                        "questionId": {"S": "Q101"},
+                        "correctAnswer": {"S": "C"},
+                        "category": {"S": "Get Test"},
+                        "question": {"S": "Get Q1"},
+                        "options": {
+                            "L": [
+                                {"M": {"id": {"S": "A"}, "text": {"S": "A"}}},
+                                {"M": {"id": {"S": "C"}, "text": {"S": "C"}}},
+                            ]
+                        },
+                        "explanation": {"S": "Get E1"},
+                    }
+                }
+            }
+        },
+    }
+    mock_dynamodb_client.get_item.return_value = {"Item": legacy_item}
+
+    session_data = await get_session_data(mock_dynamodb_client, session_id)
+
+    assert isinstance(session_data, SessionData)
+    assert session_data.ttl == ttl_valid
+    assert session_data.problem_data == {
+        "Q101": SessionDataItem.model_validate(_VALID_SESSION_PROBLEM_DATA["Q101"])
+    }
+
+
+async def test_get_session_data_not_found(mock_now, mock_dynamodb_client):
     """get_session_data: セッションデータが見つからない場合に None"""
     session_id = "test-session-get-notfound"
     # get_item が空のレスポンス (Item がない) を返す
-    mock_db_table.get_item.return_value = {}
+    mock_dynamodb_client.get_item.return_value = {}
 
-    session_data = get_session_data(session_id)
+    session_data = await get_session_data(mock_dynamodb_client, session_id)
 
     assert session_data is None
-    mock_db_table.get_item.assert_called_once_with(Key={"sessionId": session_id})
-    # Item がなければ TTL チェックは行われないので time.time は呼ばれないはず
-    mock_time.time.assert_not_called()
+    mock_dynamodb_client.get_item.assert_awaited_once_with(
+        **_expected_get_item_kwargs(session_id)
+    )
+    # Item がなければ TTL チェックは行われないので _now は呼ばれないはず
+    mock_now.assert_not_called()
 
 
-@patch(MOCK_DYNAMODB_TABLE)
-@patch(MOCK_TIME_MODULE)
-def test_get_session_data_ttl_expired(mock_time, mock_db_table):
+async def test_get_session_data_ttl_expired(mock_now, mock_dynamodb_client):
     """get_session_data: TTL が切れている場合に None"""
     session_id = "test-session-get-expired"
-    current_time = 1700000000
-    ttl_expired = current_time - 100  # 過去のTTL
-    mock_time.time.return_value = current_time
+    ttl_expired = _SESSION_CURRENT_TIME - 100  # 過去のTTL
+    mock_now.return_value = _SESSION_CURRENT_TIME
 
-    mock_item = {
-        "sessionId": session_id,
-        "ttl": Decimal(str(ttl_expired)),  # 期限切れのTTL
-        "problem_data": {
-            "Q1": {"questionId": "Q1", "correctAnswer": "A", "options": []}
-        },  # ダミー
-    }
-    mock_db_table.get_item.return_value = {"Item": mock_item}
+    mock_item = _make_session_item(
+        session_id, ttl_expired, _VALID_SESSION_PROBLEM_DATA  # 期限切れのTTL
+    )
+    mock_dynamodb_client.get_item.return_value = {"Item": mock_item}
 
-    session_data = get_session_data(session_id)
+    session_data = await get_session_data(mock_dynamodb_client, session_id)
 
     assert session_data is None
-    mock_db_table.get_item.assert_called_once_with(Key={"sessionId": session_id})
-    mock_time.time.assert_called_once()  # TTL チェックのために呼ばれる
+    mock_dynamodb_client.get_item.assert_awaited_once_with(
+        **_expected_get_item_kwargs(session_id)
+    )
+    mock_now.assert_called_once()  # TTL チェックのために呼ばれる
 
 
-@patch(MOCK_DYNAMODB_TABLE)
-def test_get_session_data_db_error(mock_db_table):
+async def test_get_session_data_db_error(mock_dynamodb_client):
     """get_session_data: DynamoDB アクセスでエラーが発生した場合 ServiceError"""
     session_id = "test-session-get-dberror"
-    from botocore.exceptions import ClientError
-
-    mock_db_table.get_item.side_effect = ClientError({}, "GetItem")
+    mock_dynamodb_client.get_item.side_effect = ClientError({}, "GetItem")
 
     with pytest.raises(ServiceError) as excinfo:
-        get_session_data(session_id)
+        await get_session_data(mock_dynamodb_client, session_id)
 
     assert excinfo.value.status_code == 500
     assert "Failed to retrieve session data" in excinfo.value.detail
-    mock_db_table.get_item.assert_called_once_with(Key={"sessionId": session_id})
+    mock_dynamodb_client.get_item.assert_awaited_once_with(
+        **_expected_get_item_kwargs(session_id)
+    )
 
 
-@patch(MOCK_DYNAMODB_TABLE)
-@patch(MOCK_TIME_MODULE)
-def test_get_session_data_validation_error(mock_time, mock_db_table):
-    """get_session_data: DB から取得したデータが不正でパースに失敗した場合 None"""
+async def test_get_session_data_validation_error(mock_now, mock_dynamodb_client):
+    """get_session_data: DB から取得したデータが不正でパースに失敗した場合 ServiceError"""
     session_id = "test-session-get-parse-error"
-    current_time = 1700000000
-    ttl_valid = current_time + 1000
-    mock_time.time.return_value = current_time
-
-    # problem_data の形式が不正 (例: correctAnswer がない) なアイテム
-    mock_invalid_item = {
-        "sessionId": session_id,
-        "ttl": Decimal(str(ttl_valid)),
-        "problem_data": {
-            "Q1": {
-                "questionId": "Q1",
-                # "correctAnswer": "A", # 必須フィールドが欠けている
-                "options": [],
-            }
-        },
-    }
-    mock_db_table.get_item.return_value = {"Item": mock_invalid_item}
+    ttl_valid = _SESSION_CURRENT_TIME + 1000
+    mock_now.return_value = _SESSION_CURRENT_TIME
+
+    mock_invalid_item = _make_session_item(
+        session_id, ttl_valid, _INVALID_SESSION_PROBLEM_DATA
+    )
+    mock_dynamodb_client.get_item.return_value = {"Item": mock_invalid_item}
 
-    # get_session_data は内部で Validation Error を捕捉し None を返す実装
-    session_data = get_session_data(session_id)
+    # get_session_data は内部で Validation Error を捕捉し ServiceError を送出する
+    with pytest.raises(ServiceError) as excinfo:
+        await get_session_data(mock_dynamodb_client, session_id)
 
-    assert session_data is None
-    mock_db_table.get_item.assert_called_once_with(Key={"sessionId": session_id})
+    assert excinfo.value.status_code == 500
+    assert "Failed to process session data" in excinfo.value.detail
+    mock_dynamodb_client.get_item.assert_awaited_once_with(
+        **_expected_get_item_kwargs(session_id)
+    )
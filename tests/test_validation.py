@@ -15,64 +15,70 @@ from app.models import (  # 必要なモデル
 # --- Fixtures for Test Data ---
 
 
-@pytest.fixture
+# SessionDataItem は frozen なので、モジュール読み込み時に1度だけ作って全テストで共有する
+_ITEM_Q1 = SessionDataItem(
+    questionId="Q001",
+    correctAnswer="A",
+    category="Test Category 1",
+    question="Test Question 1",
+    options=[
+        Option(id="A", text="Ans A"),
+        Option(id="B", text="Ans B"),
+        Option(id="C", text="Ans C"),
+    ],
+    explanation="Explanation 1",
+)
+_ITEM_Q2 = SessionDataItem(
+    questionId="Q002",
+    correctAnswer="B",  # 正解は B
+    category="Test Category 2",
+    question="Test Question 2",
+    options=[
+        Option(id="A", text="Ans A"),
+        Option(id="B", text="Ans B"),
+        Option(id="C", text="Ans C"),
+    ],
+    explanation="Explanation 2",
+)
+
+
+@pytest.fixture(scope="module")
 def base_session_data_item_q1() -> SessionDataItem:
-    """基本的な SessionDataItem (Q001, 正解 A) を生成する Fixture"""
-    return SessionDataItem(
-        questionId="Q001",
-        correctAnswer="A",
-        category="Test Category 1",
-        question="Test Question 1",
-        options=[
-            Option(id="A", text="Ans A"),
-            Option(id="B", text="Ans B"),
-            Option(id="C", text="Ans C"),
-        ],
-        explanation="Explanation 1",
-    )
-
-
-@pytest.fixture
+    """基本的な SessionDataItem (Q001, 正解 A) を返す Fixture"""
+    return _ITEM_Q1
+
+
+@pytest.fixture(scope="module")
 def base_session_data_item_q2() -> SessionDataItem:
-    """基本的な SessionDataItem (Q002, 正解 B) を生成する Fixture"""
-    return SessionDataItem(
-        questionId="Q002",
-        correctAnswer="B",  # 正解は B
-        category="Test Category 2",
-        question="Test Question 2",
-        options=[
-            Option(id="A", text="Ans A"),
-            Option(id="B", text="Ans B"),
-            Option(id="C", text="Ans C"),
-        ],
-        explanation="Explanation 2",
-    )
-
-
-@pytest.fixture
-def create_session_data_fixture():
-    """SessionData を生成する Fixture ファクトリ"""
+    """基本的な SessionDataItem (Q002, 正解 B) を返す Fixture"""
+    return _ITEM_Q2
+
 
-    def _create_session_data(items: List[SessionDataItem]) -> SessionData:
-        problem_data: Dict[str, SessionDataItem] = {
-            item.questionId: item for item in items
-        }
-        # テスト実行において ttl の値自体は validate_answers では使われないため固定値でOK
-        return SessionData(problem_data=problem_data, ttl=9999999999)
+def _create_session_data(items: List[SessionDataItem]) -> SessionData:
+    problem_data: Dict[str, SessionDataItem] = {item.questionId: item for item in items}
+    # テスト実行において ttl の値自体は validate_answers では使われないため固定値でOK
+    return SessionData(problem_data=problem_data, ttl=9999999999)
 
+
+# よく使うセッションはモジュール読み込み時に1度だけ作る
+_SESSION_Q1 = _create_session_data([_ITEM_Q1])
+_SESSION_Q2 = _create_session_data([_ITEM_Q2])
+_SESSION_Q1_Q2 = _create_session_data([_ITEM_Q1, _ITEM_Q2])
+
+
+@pytest.fixture(scope="module")
+def create_session_data_fixture():
+    """SessionData を生成する Fixture ファクトリ (パラメータ化したテストで使う)"""
     return _create_session_data
 
 
 # --- Existing Tests (Refactored using Fixtures) ---
 
 
-def test_validate_answers_correct(
-    base_session_data_item_q1, create_session_data_fixture
-):
+def test_validate_answers_correct(base_session_data_item_q1):
     """ユーザーの解答が正解の場合"""
     user_answers = [Answer(questionId="Q001", answer="A", displayOrder=["C", "A", "B"])]
-    # Fixture を使ってセッションデータを作成
-    session_data = create_session_data_fixture([base_session_data_item_q1])
+    session_data = _SESSION_Q1
     # 元のセッションデータアイテムを比較用に取得
     item = base_session_data_item_q1
 
@@ -89,16 +95,15 @@ def test_validate_answers_correct(
     assert result.category == item.category
     assert result.question == item.question
     assert result.explanation == item.explanation
-    assert result.options == item.options  # options も含まれることを確認
+    # options はセッションのリストをコピーせずそのまま渡す (validate_answers の約束事)
+    assert result.options is item.options
     assert result.displayOrder == ["C", "A", "B"]
 
 
-def test_validate_answers_incorrect(
-    base_session_data_item_q2, create_session_data_fixture
-):
+def test_validate_answers_incorrect(base_session_data_item_q2):
     """ユーザーの解答が不正解の場合"""
     user_answers = [Answer(questionId="Q002", answer="C", displayOrder=["B", "C", "A"])]
-    session_data = create_session_data_fixture([base_session_data_item_q2])
+    session_data = _SESSION_Q2
     item = base_session_data_item_q2
 
     results = validate_answers(user_answers, session_data)
@@ -113,22 +118,20 @@ def test_validate_answers_incorrect(
     assert result.category == item.category
     assert result.question == item.question
     assert result.explanation == item.explanation
-    assert result.options == item.options
+    assert result.options is item.options
     assert result.displayOrder == ["B", "C", "A"]
 
 
 def test_validate_answers_multiple(
-    base_session_data_item_q1, base_session_data_item_q2, create_session_data_fixture
+    base_session_data_item_q1, base_session_data_item_q2
 ):
     """複数の問題がある場合 (正解と不正解が混在)"""
     user_answers = [
         Answer(questionId="Q001", answer="A", displayOrder=["A", "B"]),  # 正解
         Answer(questionId="Q002", answer="C", displayOrder=["C", "B"]),  # 不正解
     ]
-    # Q001 と Q002 のデータを含むセッションを作成
-    session_data = create_session_data_fixture(
-        [base_session_data_item_q1, base_session_data_item_q2]
-    )
+    # Q001 と Q002 のデータを含むセッション
+    session_data = _SESSION_Q1_Q2
 
     results = validate_answers(user_answers, session_data)
 
@@ -143,7 +146,7 @@ def test_validate_answers_multiple(
     assert res1.userAnswer == "A"
     assert res1.correctAnswer == item1.correctAnswer
     assert res1.question == item1.question
-    assert res1.options == item1.options
+    assert res1.options is item1.options
     assert res1.explanation == item1.explanation
     assert res1.category == item1.category
     assert res1.displayOrder == ["A", "B"]
@@ -156,61 +159,46 @@ def test_validate_answers_multiple(
     assert res2.userAnswer == "C"
     assert res2.correctAnswer == item2.correctAnswer  # 正解は 'B'
     assert res2.question == item2.question
-    assert res2.options == item2.options
+    assert res2.options is item2.options
     assert res2.explanation == item2.explanation
     assert res2.category == item2.category
     assert res2.displayOrder == ["C", "B"]
 
 
-def test_validate_answers_question_not_in_session(
-    base_session_data_item_q1, create_session_data_fixture
+@pytest.mark.parametrize(
+    "user_answers, items",
+    [
+        pytest.param([], [], id="empty_input"),
+        pytest.param(
+            [Answer(questionId="Q001", answer="A", displayOrder=["A", "B"])],
+            [],
+            id="empty_session_problems",
+        ),
+        pytest.param(
+            [Answer(questionId="Q999", answer="A", displayOrder=["A", "B"])],
+            [_ITEM_Q1],  # セッションには Q001 しか含まない
+            id="question_not_in_session",
+        ),
+    ],
+)
+def test_validate_answers_returns_no_results(
+    user_answers, items, create_session_data_fixture
 ):
-    """ユーザー解答の questionId がセッションデータに存在しない場合"""
-    user_answers = [
-        Answer(
-            questionId="Q999", answer="A", displayOrder=["A", "B"]
-        )  # Q999 はセッションにない
-    ]
-    # セッションには Q001 しか含まない
-    session_data = create_session_data_fixture([base_session_data_item_q1])
+    """
+    結果が空になる場合: 解答リストが空・セッションの problem_data が空・
+    解答の questionId がセッションに存在しない (存在しない問題IDは無視される)
+    """
+    session_data = create_session_data_fixture(items)
 
     results = validate_answers(user_answers, session_data)
 
-    # 存在しない問題IDは無視され、結果リストは空になるはず
-    assert len(results) == 0
-    assert results == []
+    assert not results
 
 
 # --- New Tests ---
 
 
-def test_validate_answers_empty_input():
-    """ユーザーの解答リストが空の場合"""
-    user_answers: List[Answer] = []
-    # セッションデータはダミー (problem_data が空でも良い)
-    session_data = SessionData(problem_data={}, ttl=9999999999)
-
-    results = validate_answers(user_answers, session_data)
-
-    # 結果リストも空になるはず
-    assert results == []
-
-
-def test_validate_answers_empty_session_problems(create_session_data_fixture):
-    """セッションデータの problem_data が空の場合"""
-    user_answers = [Answer(questionId="Q001", answer="A", displayOrder=["A", "B"])]
-    # problem_data が空のセッションデータを作成
-    session_data = create_session_data_fixture([])
-
-    results = validate_answers(user_answers, session_data)
-
-    # 解答に対応する問題がセッションにないため、結果リストは空になるはず
-    assert results == []
-
-
-def test_validate_answers_duplicate_question_id(
-    base_session_data_item_q1, create_session_data_fixture
-):
+def test_validate_answers_duplicate_question_id(base_session_data_item_q1):
     """ユーザー解答に重複した questionId がある場合"""
     user_answers = [
         Answer(questionId="Q001", answer="A", displayOrder=["A", "B"]),  # 正解
@@ -218,7 +206,7 @@ def test_validate_answers_duplicate_question_id(
             questionId="Q001", answer="B", displayOrder=["B", "A"]
         ),  # 不正解 (同じID)
     ]
-    session_data = create_session_data_fixture([base_session_data_item_q1])
+    session_data = _SESSION_Q1
 
     results = validate_answers(user_answers, session_data)
 
@@ -244,18 +232,14 @@ def test_validate_answers_duplicate_question_id(
     assert results[1].question == base_session_data_item_q1.question
 
 
-def test_validate_answers_invalid_user_answer(
-    base_session_data_item_q1, create_session_data_fixture
-):
+def test_validate_answers_invalid_user_answer(base_session_data_item_q1):
     """ユーザー解答の answer が選択肢に存在しない不正な値の場合"""
     user_answers = [
         Answer(
             questionId="Q001", answer="X", displayOrder=["A", "B", "C"]
         )  # 'X' は不正な選択肢ID
     ]
-    session_data = create_session_data_fixture(
-        [base_session_data_item_q1]
-    )  # 正解は 'A'
+    session_data = _SESSION_Q1  # 正解は 'A'
 
     results = validate_answers(user_answers, session_data)
 
@@ -267,6 +251,6 @@ def test_validate_answers_invalid_user_answer(
     assert result.userAnswer == "X"  # ユーザーが送信した値がそのまま入る
     assert result.correctAnswer == "A"  # 正解は 'A'
     assert result.question == base_session_data_item_q1.question
-    assert result.options == base_session_data_item_q1.options
+    assert result.options is base_session_data_item_q1.options
     assert result.explanation == base_session_data_item_q1.explanation
     assert result.displayOrder == ["A", "B", "C"]